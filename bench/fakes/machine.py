@@ -0,0 +1,73 @@
+# coding: utf-8
+
+################################################################################
+# MicroPython の machine の代わり (ベンチマーク用)
+#
+# ・Pin        出力値を保持するだけのGPIO
+# ・I2C        smbus.py と同じ模擬装置を接続したI2Cバス
+#              (writeto_mem, readfrom_mem, writeto, readfrom)
+# ・deepsleep  DeepSleep 例外を発生させ、スクリプトの1回分の動作を終了します
+# ※ RTC は定義しません(Pico と同じく RTCメモリ無しとして動作します)
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import smbus
+import simtime
+
+class DeepSleep(SystemExit):                        # deepsleep() で発生する例外
+    def __init__(self, ms=0):
+        super().__init__(0)
+        self.ms = ms
+
+class Pin:
+    OUT = 1
+    IN = 0
+
+    def __init__(self, pin, mode=IN, *args, **kwargs):
+        self.pin = pin
+        self._value = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def toggle(self):
+        self._value ^= 1
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.bus = smbus.SMBus(id)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.bus.write_byte_data(addr, memaddr, buf[0] if len(buf) else None)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        return bytes(self.bus.read_i2c_block_data(addr, memaddr, nbytes))
+
+    def writeto(self, addr, buf):
+        if len(buf) > 1:
+            self.bus.write_byte_data(addr, buf[0], buf[1])
+        else:
+            self.bus.write_byte(addr, buf[0])
+        return len(buf)
+
+    def readfrom(self, addr, nbytes):
+        return bytes(self.bus.read_i2c_block_data(addr, None, nbytes))
+
+    def scan(self):
+        return sorted(self.bus.devices)
+
+def deepsleep(ms=0):
+    simtime.sleep(ms / 1000.)
+    raise DeepSleep(ms)
+
+def lightsleep(ms=0):
+    simtime.sleep(ms / 1000.)
@@ -0,0 +1,43 @@
+# coding: utf-8
+
+################################################################################
+# MicroPython の network の代わり (ベンチマーク用)
+#
+# WLAN.connect() から connect_time 秒後(模擬時計)に接続済みになります。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import simtime
+
+STA_IF = 0
+AP_IF = 1
+connect_time = 1.5                                  # 接続までの時間(秒)
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self._active = False
+        self._t_connect = None
+        self._ifconfig = ('192.168.0.3', '255.255.255.0', '192.168.0.1',
+                          '192.168.0.1')
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._t_connect = None
+
+    def connect(self, ssid=None, key=None):
+        self._t_connect = simtime.now() + connect_time
+
+    def disconnect(self):
+        self._t_connect = None
+
+    def isconnected(self):
+        return self._t_connect is not None and simtime.now() >= self._t_connect
+
+    def ifconfig(self, conf=None):
+        if conf is None:
+            return self._ifconfig
+        self._ifconfig = tuple(conf)
@@ -0,0 +1,26 @@
+# coding: utf-8
+
+################################################################################
+# 模擬装置で共有する時計 (ベンチマーク用)
+#
+# 実時間(perf_counter)に sleep() した時間を加えた時刻を応答します。
+# sleep() は実際には待たずに時刻だけを進めるため、センサの変換待ちや
+# ディープスリープの周期を待たずに処理時間だけを測定できます。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+from time import perf_counter
+
+slept = 0.                                          # sleep() した時間の合計
+on_sleep = None                                     # sleep() 時に呼び出す関数
+
+def now():
+    return perf_counter() + slept
+
+def sleep(sec):
+    global slept
+    if on_sleep:
+        on_sleep(sec)
+    if sec > 0:
+        slept += sec
@@ -0,0 +1,24 @@
+# coding: utf-8
+
+################################################################################
+# smbus の代わり (ベンチマーク用, raspi/i2c_sim.py の模擬装置を接続済み)
+#
+# SMBus(1) は SHT31(0x44, 0x45) と BH1750FVI(0x23) を接続したバスを応答します。
+# 時刻は simtime.py の模擬時計を使用します。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import i2c_sim
+import simtime
+
+def make_devices():
+    return [i2c_sim.SimSHT31(0x44, 29.2, 70.),
+            i2c_sim.SimSHT31(0x45, 28.5, 65.),
+            i2c_sim.SimBH1750(0x23, 10000.)]
+
+class SMBus(i2c_sim.FakeSMBus):
+    def __init__(self, bus=1):
+        super().__init__(bus, simtime.now)
+        for dev in make_devices():
+            self.add(dev)
@@ -0,0 +1,34 @@
+# coding: utf-8
+
+################################################################################
+# MicroPython の usocket の代わり (ベンチマーク用)
+#
+# UDP の送信データを sent に (データ, 宛先) として記録します。
+# target に (ホスト, ポート) を設定すると、実際にそこへ送信します。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import socket as _socket
+
+AF_INET = _socket.AF_INET
+SOCK_DGRAM = _socket.SOCK_DGRAM
+sent = []                                           # 送信データと宛先
+target = None                                       # 実際の送信先
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_DGRAM, proto=0):
+        self._sock = None
+        if target:
+            self._sock = _socket.socket(af, type)
+
+    def sendto(self, data, addr):
+        sent.append((bytes(data), addr))
+        if self._sock:
+            self._sock.sendto(data, target)
+        return len(data)
+
+    def close(self):
+        if self._sock:
+            self._sock.close()
+            self._sock = None
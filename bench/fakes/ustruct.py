@@ -0,0 +1,3 @@
+# coding: utf-8
+# MicroPython の ustruct の代わり (ベンチマーク用)
+from struct import *
@@ -0,0 +1,27 @@
+# coding: utf-8
+
+################################################################################
+# MicroPython の utime の代わり (ベンチマーク用, simtime.py の模擬時計)
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import simtime
+
+def sleep(sec):
+    simtime.sleep(sec)
+
+def sleep_ms(ms):
+    simtime.sleep(ms / 1000.)
+
+def sleep_us(us):
+    simtime.sleep(us / 1000000.)
+
+def ticks_ms():
+    return int(simtime.now() * 1000.)
+
+def ticks_us():
+    return int(simtime.now() * 1000000.)
+
+def ticks_diff(t1, t2):
+    return t1 - t2
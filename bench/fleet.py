@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# CSVxUDP 送信機の群(フリート)を模擬します (udp_collector.py の負荷試験用)
+#
+# humid_1 〜 humid_N の N 台の仮想デバイスが「device_s, temp,hum,wbgt」形式の
+# 行を送信します。温度と湿度はデバイス毎に 0.01 単位で少しずつ変化(ランダム
+# ウォーク)させます。温度は送信毎に必ず変化させるため、同じ内容の行が続かず、
+# 受信機で再送として破棄されません。
+#
+# 使用方法：
+#   ./fleet.py [台数] [送信レート(パケット/秒, 全台の合計)] [時間(秒)] [ソケット数]
+#
+# ソケット数を2以上にすると、デバイス毎に送信元ポートを分けます(実機と同様
+# に送信元が異なるため、udp_sharded.py の複数ワーカに振り分けられます)。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+udp_to = '127.0.0.1'                                # 送信先(ループバック)
+udp_port = 1024                                     # UDPポート番号
+n_devices = 1000                                    # 仮想デバイスの台数
+rate = 10000                                        # 送信レート(パケット/秒)
+duration = 10.                                      # 送信時間(秒)
+n_sockets = 1                                       # 送信元ソケット数
+wbgt_ver = 3                                        # WBGTバージョン 3または4
+wbgt_wide = True                                    # 筆者の独自拡張Wide版
+
+import os
+import random
+import socket
+import sys
+from time import perf_counter, sleep
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'raspi'))
+from wbgt_calc import wbgt                          # WBGTの計算
+from udp_replay import replay                       # UDP送信
+
+def packets(n_devices=n_devices, count=None, seed=0):
+    # 各デバイスが順番に1行ずつ送信する (count=None の時は無制限)
+    rnd = random.Random(seed)
+    temp = [rnd.randrange(2000, 3500) for i in range(n_devices)]   # 0.01℃単位
+    hum = [rnd.randrange(3000, 9000) for i in range(n_devices)]    # 0.01％単位
+    i = 0
+    while count is None or i < count:
+        d = i % n_devices
+        step = rnd.choice((-1, 1)) * rnd.randint(1, 10)  # 0 以外の変化量
+        t = temp[d] + step
+        if not -1000 <= t <= 5000:                  # 範囲外の時は逆方向へ
+            t = temp[d] - step
+        temp[d] = t
+        hum[d] = min(max(hum[d] + rnd.randint(-50, 50), 0), 10000)
+        t = t / 100.
+        h = hum[d] / 100.
+        w = wbgt(t, h, wbgt_ver, wbgt_wide)
+        yield ('humid_%d, %.2f,%.2f,%.2f\n' % (d + 1, t, h, w)).encode()
+        i += 1
+
+def run(n_devices=n_devices, rate=rate, duration=duration, host=udp_to,
+        port=udp_port, n_sockets=n_sockets):
+    # 送信したパケット数を応答する
+    count = int(rate * duration)
+    if n_sockets <= 1:
+        return replay(packets(n_devices, count), host, port, rate)
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+             for i in range(n_sockets)]
+    addr = (host, port)
+    n = 0
+    t0 = perf_counter()
+    try:
+        for data in packets(n_devices, count):
+            if rate:
+                wait = t0 + n / rate - perf_counter()
+                if wait > 0:
+                    sleep(wait)
+            socks[(n % n_devices) % n_sockets].sendto(data, addr)
+            n += 1
+    finally:
+        for sock in socks:
+            sock.close()
+    return n
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        n_devices = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        rate = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        duration = float(sys.argv[3])
+    if len(sys.argv) > 4:
+        n_sockets = int(sys.argv[4])
+    t0 = perf_counter()
+    n = run(n_devices, rate, duration, n_sockets=n_sockets)
+    dt = perf_counter() - t0
+    print("%d devices, sent %d packets, %.3f s (%.0f packets/s)"
+          % (n_devices, n, dt, n / dt))
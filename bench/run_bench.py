@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# ベンチマーク (実機無しで raspi/ と raspi-pico/ のスクリプトを測定します)
+#
+# fakes/ の smbus, machine, utime, network, usocket を組み込んで各スクリプトを
+# そのまま実行し、以下を測定して JSON ファイルに保存します。各スクリプトは
+# 同じフォルダのモジュールのみ import できる状態で実行します(raspi-pico/ の
+# スクリプトが raspi/ のモジュールを使っていると実機と同じく ImportError)。
+# 前回の結果を指定すると、各項目の変化を表示します(リリース間の性能低下の
+# 確認用)。
+#
+#   loop     1回の測定(ループ1周, Pico はディープスリープ1回分)の処理時間
+#            センサの変換待ちや sleep() は模擬時計で進めるため含みません
+#   convert  WBGT換算の処理能力 (行/秒)
+#   receiver udp_collector.py の受信能力 (fleet.py の送信数と受信数, 損失率)
+#            損失率 loss は送信数に対して受け取れなかったレコードの割合、
+#            packet_loss はソケットで受信できなかったパケットの割合です
+#   sharded  udp_sharded.py のワーカ数毎の受信能力 (同上, SO_REUSEPORT)
+#   dispatch udp_sharded.py の broadcast = True (受信プロセスで振り分け)の
+#            ワーカ数毎の受信能力 (同上)
+#
+# 使用方法：
+#   ./run_bench.py [出力ファイル.json] [前回の結果.json]
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+loop_count = 200                                    # ループの測定回数
+wake_count = 50                                     # Pico のディープスリープ回数
+convert_rows = 1000000                              # WBGT換算の行数(一括処理)
+fleet_devices = 2000                                # 仮想デバイスの台数
+fleet_rate = 20000                                  # 送信レート(パケット/秒)
+fleet_duration = 3.                                 # 送信時間(秒)
+fleet_sockets = 64                                  # 送信元ソケット数(sharded)
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+from time import perf_counter
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+RASPI = os.path.join(ROOT, 'raspi')
+PICO = os.path.join(ROOT, 'raspi-pico')
+sys.path[:0] = [os.path.join(BENCH, 'fakes'), BENCH, RASPI, PICO]
+
+import simtime                                      # 模擬時計
+import machine
+import usocket
+
+class StopLoop(Exception):
+    pass
+
+def summary(values):
+    # 処理時間(秒)のリストを ms 単位の統計値に変換する
+    v = sorted(values)
+    n = len(v)
+    return {'n': n,
+            'mean_ms': sum(v) / n * 1000.,
+            'p50_ms': v[n // 2] * 1000.,
+            'p99_ms': v[min(n - 1, n * 99 // 100)] * 1000.,
+            'max_ms': v[-1] * 1000.}
+
+def configure(path, conf):
+    # スクリプト先頭の設定値(変数 = 値)を conf の値に置き換えたソースを応答
+    with open(path, encoding='utf-8') as f:
+        src = f.read()
+    for name, value in conf.items():
+        src, n = re.subn(r'^%s\s*=\s*[^#\n]*' % re.escape(name),
+                         '%s = %r ' % (name, value), src, count=1, flags=re.M)
+        if not n:
+            raise KeyError(name)
+    return src
+
+def _own(m):
+    # raspi/ 又は raspi-pico/ のモジュールの時 True
+    return os.path.dirname(getattr(m, '__file__', None) or '') in (RASPI, PICO)
+
+@contextlib.contextmanager
+def deployed(path):
+    # path と同じフォルダ(と fakes/)のモジュールのみ import できるようにする
+    other = {RASPI, PICO} - {os.path.dirname(os.path.abspath(path))}
+    saved_path = sys.path[:]
+    saved = {name: m for name, m in sys.modules.items() if _own(m)}
+    for name in saved:
+        del sys.modules[name]
+    sys.path[:] = [p for p in sys.path if p not in other]
+    try:
+        yield
+    finally:
+        for name in [name for name, m in sys.modules.items() if _own(m)]:
+            del sys.modules[name]
+        sys.modules.update(saved)
+        sys.path[:] = saved_path
+
+def bench_loop(path, conf={}, count=loop_count):
+    # 無限ループのスクリプトを count 周分実行し、1周毎の処理時間を測定する
+    # (0.5秒以上の sleep() をループの区切りとする)
+    src = configure(path, conf)
+    marks = []
+
+    def on_sleep(sec):
+        if sec >= 0.5:
+            marks.append(perf_counter())
+            if len(marks) > count:
+                raise StopLoop
+
+    simtime.on_sleep = on_sleep
+    real_sleep = time.sleep
+    time.sleep = simtime.sleep
+    marks.append(perf_counter())
+    try:
+        with deployed(path), contextlib.redirect_stdout(io.StringIO()):
+            exec(compile(src, path, 'exec'), {'__name__': '__main__'})
+    except StopLoop:
+        pass
+    finally:
+        time.sleep = real_sleep
+        simtime.on_sleep = None
+    return summary([b - a for a, b in zip(marks, marks[1:])])
+
+def bench_wake(path, conf={}, count=wake_count):
+    # ディープスリープで終了するスクリプトを count 回実行する
+    src = configure(path, conf)
+    code = compile(src, path, 'exec')
+    times = []
+    cwd = os.getcwd()
+    usocket.sent.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)                               # 保存ファイルの書き込み先
+        try:
+            with deployed(path):
+                for i in range(count):
+                    t0 = perf_counter()
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            exec(code, {'__name__': '__main__'})
+                    except machine.DeepSleep:
+                        pass
+                    times.append(perf_counter() - t0)
+        finally:
+            os.chdir(cwd)
+    res = summary(times)
+    res['sent'] = len(usocket.sent)                 # 送信パケット数
+    return res
+
+def bench_convert(rows=convert_rows):
+    import random
+    from wbgt_calc import wbgt, wbgt_batch, np
+    import wbgt_fixed
+    import sht31
+    rnd = random.Random(0)
+    n = rows // 10                                  # 1行毎の処理は少なめに
+    temp = [rnd.uniform(-10., 50.) for i in range(n)]
+    hum = [rnd.uniform(0., 100.) for i in range(n)]
+    res = {}
+    t0 = perf_counter()
+    for t, h in zip(temp, hum):
+        wbgt(t, h, 3, True)
+    res['wbgt_rows_s'] = n / (perf_counter() - t0)
+    coef = wbgt_fixed.coef_fixed(3, True)
+    raw = [rnd.randrange(65536) for i in range(n)]
+    t0 = perf_counter()
+    for r in raw:
+        wbgt_fixed.wbgt100_raw(r, r, coef)
+    res['wbgt_fixed_rows_s'] = n / (perf_counter() - t0)
+    if np is not None:
+        temp = np.random.default_rng(0).uniform(-10., 50., rows)
+        hum = np.random.default_rng(1).uniform(0., 100., rows)
+        wbgt_batch(temp, hum, 3, True)              # 初回の準備を除く
+        t0 = perf_counter()
+        wbgt_batch(temp, hum, 3, True)
+        res['wbgt_batch_rows_s'] = rows / (perf_counter() - t0)
+    frames = bytes([0x66, 0x66, 0x93, 0x8F, 0x5C, 0x38]) * n
+    sht31.decode_frames(frames[:6])
+    t0 = perf_counter()
+    sht31.decode_frames(frames)
+    res['sht31_frames_s'] = n / (perf_counter() - t0)
+    res['numpy'] = np is not None
+    return res
+
+def bench_receiver(n_devices=fleet_devices, rate=fleet_rate,
+                   duration=fleet_duration):
+    import fleet
+    import udp_collector
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        records = [0]
+        def count(recs):
+            records[0] += len(recs)
+        transport, proto = await udp_collector.start(count, port=0,
+                                                     host='127.0.0.1')
+        port = transport.get_extra_info('sockname')[1]
+        t0 = perf_counter()
+        sent = await loop.run_in_executor(
+            None, fleet.run, n_devices, rate, duration, '127.0.0.1', port)
+        dt = perf_counter() - t0
+        await asyncio.sleep(0.5)                    # 受信の完了待ち
+        transport.close()
+        await asyncio.sleep(0)
+        proto.flush()
+        return sent, dt, proto, records[0]
+
+    sent, dt, proto, n_records = asyncio.run(run())
+    return {'devices': n_devices, 'rate': rate, 'sent': sent,
+            'sent_s': sent / dt, 'received': proto.received,
+            'records': n_records, 'dropped': proto.dropped,
+            'duplicated': proto.duplicated,
+            'loss': 1. - n_records / sent if sent else 0.,
+            'packet_loss': 1. - proto.received / sent if sent else 0.}
+
+def bench_sharded(n_workers, n_devices=fleet_devices, rate=fleet_rate,
+                  duration=fleet_duration, broadcast=False):
+    import fleet
+    import udp_sharded
+    col = udp_sharded.ShardedCollector(n_workers, port=0, host='127.0.0.1',
+                                       broadcast=broadcast).start()
+    result = []                                     # 送信数
+    size = 0                                        # 受信レコードのバイト数
+    try:
+        def sender():
+            result.append(fleet.run(n_devices, rate, duration, '127.0.0.1',
+                                    col.port, fleet_sockets))
+        time.sleep(0.2)                             # ワーカの起動待ち
+        t0 = perf_counter()
+        th = threading.Thread(target=sender)
+        th.start()
+        while th.is_alive():
+            size += sum(len(c) for c in col.poll())
+            time.sleep(0.01)
+        dt = perf_counter() - t0
+        time.sleep(0.5)                             # 受信の完了待ち
+        size += sum(len(c) for c in col.poll())
+        st = col.stats()
+    finally:
+        col.stop()
+    sent = result[0]
+    records = size // udp_sharded.RECORD_SIZE
+    return {'workers': n_workers, 'rate': rate, 'sent': sent,
+            'sent_s': sent / dt, 'records': records,
+            'received': st['received'], 'overflow': st['overflow'],
+            'backlog': st['backlog'],
+            'duplicated': st['duplicated'],
+            'loss': 1. - records / sent if sent else 0.,
+            'packet_loss': 1. - st['received'] / sent if sent else 0.}
+
+def run_all():
+    res = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'python': platform.python_version(),
+           'machine': platform.machine()}
+    loop = res['loop'] = {}
+    loop['raspi/wbgt.py'] = bench_loop(os.path.join(RASPI, 'wbgt.py'))
+    loop['raspi/wbgt.py periodic'] = bench_loop(
+        os.path.join(RASPI, 'wbgt.py'), {'sht31_mps': 2})
+    loop['raspi/wbgt_lum.py'] = bench_loop(os.path.join(RASPI, 'wbgt_lum.py'))
+    loop['raspi-pico/example04_wbgt.py'] = bench_loop(
+        os.path.join(PICO, 'example04_wbgt.py'))
+    udp_le = os.path.join(PICO, 'example04_wbgt_udp_le.py')
+    loop['raspi-pico/example04_wbgt_udp_le.py csv'] = bench_wake(udp_le)
+    loop['raspi-pico/example04_wbgt_udp_le.py bin'] = bench_wake(
+        udp_le, {'udp_format': 'bin', 'low_latency': True})
+    loop['raspi-pico/example04_wbgt_udp_le.py batch'] = bench_wake(
+        udp_le, {'batch_n': 10})
+    res['convert'] = bench_convert()
+    res['receiver'] = bench_receiver()
+    n = os.cpu_count() or 1
+    if hasattr(socket, 'SO_REUSEPORT'):
+        res['sharded'] = {str(k): bench_sharded(k)
+                          for k in sorted({1, 2, n})}
+    res['dispatch'] = {str(k): bench_sharded(k, broadcast=True)
+                       for k in sorted({2, max(n, 2)})}  # 1 は振り分け無し
+    return res
+
+def compare(new, old, prefix=''):
+    # 数値の項目毎に前回からの変化率を表示する
+    for key, value in new.items():
+        name = prefix + key
+        prev = old.get(key) if isinstance(old, dict) else None
+        if isinstance(value, dict):
+            compare(value, prev or {}, name + '.')
+        elif isinstance(value, float) and isinstance(prev, (int, float)) \
+                and prev:
+            print('%-56s %12.3f -> %12.3f (%+.1f%%)'
+                  % (name, prev, value, (value / prev - 1.) * 100.))
+
+if __name__ == "__main__":
+    out = sys.argv[1] if len(sys.argv) > 1 else 'bench_result.json'
+    res = run_all()
+    with open(out, 'w') as f:
+        json.dump(res, f, indent=2)
+    print(json.dumps(res, indent=2))
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            compare(res, json.load(f))
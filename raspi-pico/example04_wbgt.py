@@ -7,6 +7,9 @@
 ################################################################################
 # WBGTバージョンの違い、筆者の独自拡張(Wide版)については下記を参照ください。
 # https://bokunimo.net/blog/raspberry-pi/4777/
+# WBGTは整数演算で計算します。SHT31の受信データは sht31.py で確認します。
+# 本ファイルと共に raspi-pico/ の wbgt_fixed.py, sht31.py も Pico に保存して
+# ください。
 ################################################################################
 # 参考文献
 # ・IchigoJam S+温湿度センサSi7021で暑さ指数WBGTを計算して、熱中症予防
@@ -31,9 +34,12 @@
 sht31 = 0x44                            # 温湿度センサSHT31のI2Cアドレス
 wbgt_ver = 3                            # WBGTバージョン 3 または 4
 wbgt_wide = True                        # 筆者の独自拡張Wide版
+sht31_mps = 0                           # 0:単発, 0.5〜10:定期測定(回/秒)
 
 from machine import Pin,I2C             # ライブラリmachineのI2Cを組み込む
 from utime import sleep                 # μtimeからsleepを組み込む
+from wbgt_fixed import coef_fixed, temp100, hum100, wbgt100, fmt1   # 整数演算版
+from sht31 import words, CMD_PERIODIC   # SHT31受信データの確認(CRC)
 
 led = Pin(25, Pin.OUT)                  # GPIO出力用インスタンスledを生成
 gnd = Pin(6, Pin.OUT)                   # GP6をSHT31のGNDピンに接続
@@ -42,32 +48,40 @@ vdd = Pin(3, Pin.OUT)                   # GP3をSHT31のV+ピンに接続
 vdd.value(1)                            # V+用に3.3Vを出力
 i2c = I2C(0, scl=Pin(5), sda=Pin(4))    # GP5をSHT31のSCL,GP4をSDAに接続
 
-temp = 0.                               # 温度値を保持する変数tempを生成
-hum  = 0.                               # 湿度値を保持する変数humを生成
+try:
+    coef = coef_fixed(wbgt_ver, wbgt_wide)  # WBGT係数(整数)を取得
+except KeyError:                        # 係数表に無いとき
+    print("ERROR:WBGTバージョンが不正")
+    coef = (0, 0, 0, 0)
+
+if sht31_mps:                           # 定期測定を開始する
+    cmd = CMD_PERIODIC[sht31_mps]
+    i2c.writeto_mem(sht31,cmd[0],bytes([cmd[1]]))
+
+temp = 0                                # 温度値(0.01℃単位)を保持する変数temp
+hum  = 0                                # 湿度値(0.01％単位)を保持する変数hum
 while True:                             # 繰り返し処理
-    i2c.writeto_mem(sht31,0x24,b'\x00') # SHT31にコマンド0x2400を送信する
-    # i2c.writeto(sht31,b'\x24\x00')    # SHT31仕様に合わせた2バイト送信表記
-    sleep(0.018)                        # SHT31の測定待ち時間
-    data = i2c.readfrom_mem(sht31,0x00,6)   # SHT31から測定値6バイトを受信
-    if len(data) >= 5:                  # 受信データが5バイト以上の時
-        temp = float((data[0]<<8) + data[1]) / 65535. * 175. - 45.
-        hum  = float((data[3]<<8) + data[4]) / 65535. * 100.
-    if wbgt_ver == 3 and wbgt_wide == False:
-        wbgt = 0.687 * temp + 0.0360 * hum + 0.00367 * temp * hum - 2.062
-    elif wbgt_ver == 3 and wbgt_wide == True:
-        wbgt = 0.725 * temp + 0.0368 * hum + 0.00364 * temp * hum - 3.246
-    elif wbgt_ver == 4 and wbgt_wide == False:
-        wbgt = 0.724 * temp + 0.0342 * hum + 0.00277 * temp * hum - 3.007
-    elif wbgt_ver == 4 and wbgt_wide == True:
-        wbgt = 0.754 * temp + 0.0382 * hum + 0.00264 * temp * hum - 3.965
+    if sht31_mps:                       # 定期測定の時
+        i2c.writeto_mem(sht31,0xE0,b'\x00') # 最新値の読み出しコマンド0xE000
     else:
-        print("ERROR:WBGTバージョンが不正")
+        i2c.writeto_mem(sht31,0x24,b'\x00') # SHT31にコマンド0x2400を送信する
+        # i2c.writeto(sht31,b'\x24\x00')    # SHT31仕様に合わせた2バイト送信表記
+        sleep(0.018)                    # SHT31の測定待ち時間
+    try:
+        data = i2c.readfrom_mem(sht31,0x00,6)   # SHT31から測定値6バイトを受信
+    except OSError:                     # 新しい測定値が無い時(NACK)
+        data = b''
+    res = words(data)                   # CRC確認後の生データ又は None
+    if res:
+        temp = temp100(res[0])
+        hum  = hum100(res[1])
+    wbgt = wbgt100(temp, hum, coef)     # WBGT(0.01℃単位)を整数演算で計算
 
-    s = str(round(temp,1))              # 小数点第1位で丸めた結果を文字列に
+    s = fmt1(temp)                      # 小数点第1位で丸めた結果を文字列に
     print('Temperature =',s, end=', ')  # 温度値を表示
-    s = str(round(hum,1))               # 小数点第1位で丸めた結果を文字列に
+    s = fmt1(hum)                       # 小数点第1位で丸めた結果を文字列に
     print('Humidity =',s, end=', ')     # 湿度値を表示
-    s = str(round(wbgt,1))              # 小数点第1位で丸めた結果を文字列に
+    s = fmt1(wbgt)                      # 小数点第1位で丸めた結果を文字列に
     print('WBGT =',s)                   # WBGT値を表示
     led.value(1)                        # LEDをONにする
     sleep(0.1)                          # 0.1秒間の待ち時間処理
@@ -10,6 +10,22 @@
 # https://bokunimo.net/blog/raspberry-pi/4777/
 # CSVxUDP方式については下記を参照ください。
 # https://bokunimo.net/iot/CSVxUDP/
+# WBGTは整数演算で計算します。SHT31の受信データは sht31.py で確認します。
+# 本ファイルと共に raspi-pico/ の wbgt_fixed.py, sht31.py も Pico に保存して
+# ください。
+# udp_format = 'bin' の時は、SHT31(とBH1750)の生データを固定長28バイトの
+# バイナリ形式で送信します。受信側は raspi/wbgt_packet.py で変換します。
+# バイナリ形式の device_s は16文字以下にしてください(超える時は送信しません)。
+# low_latency = True の時は、SHT31の測定と無線LAN接続を並行して行い、接続状態
+# を10ms間隔で確認します(上限 wifi_timeout)。DHCPで得たIPアドレス等を保存し、
+# 次回からは固定IPとして接続します。起動から送信完了までの時間を表示します。
+# 保存したIPアドレスは ip_cache_n 回使用するとDHCPで取得し直します(リース
+# 期限切れやアドレスの再割り当てによる重複を防ぐため。ip_cache_n * interval *
+# batch_n 秒がDHCPのリース時間より短くなるように設定してください)。
+# batch_n > 1 の時は、測定値(生データ6バイト)をRTCメモリ(Picoの場合はFlash)に
+# 蓄積し、batch_n 回に1回だけ無線LANを起動して、まとめて送信します(形式番号2の
+# バイナリ形式)。WBGTが alert_wbgt 以上の時は、蓄積件数に関わらず送信します。
+# batch_n が batch_max より大きい時は batch_max 件で送信します。
 ################################################################################
 # 参考文献
 # ・IchigoJam S+温湿度センサSi7021で暑さ指数WBGTを計算して、熱中症予防
@@ -38,16 +54,36 @@ udp_to = '255.255.255.255'                      # UDPブロードキャスト
 udp_port = 1024                                 # UDPポート番号
 device_s = 'humid_3'                            # デバイス識別名
 interval = 30                                   # ディープスリープ時間（秒）
+udp_format = 'csv'                              # 送信形式 'csv' または 'bin'
+seq_file = 'wbgt_seq.bin'                       # bin形式の順序番号の保存先
+low_latency = False                             # 無線LAN接続と測定を並行処理
+wifi_timeout = 10000                            # low_latency時の接続待ち上限(ms)
+ip_cache_file = 'wifi_ip.txt'                   # IPアドレス等の保存先(DHCP省略)
+ip_cache_n = 100                                # 保存したIPアドレスの使用回数の上限
+batch_n = 1                                     # N回分を蓄積して一括送信(1=毎回)
+alert_wbgt = 28.                                # この値以上のWBGTは直ぐに送信
+buf_file = 'wbgt_buf.bin'                       # 蓄積データの保存先
+batch_max = 240                                 # 蓄積の上限(1パケット1500バイト以下)
 
 sht31 = 0x44                                    # 温湿度センサSHT31のI2Cアドレス
+bh1750 = None                                   # 照度センサBH1750 0x23,無い時None
 wbgt_ver = 3                                    # WBGTバージョン 3 または 4
 wbgt_wide = True                                # 筆者の独自拡張Wide版
 
 from machine import Pin,I2C                     # machineのI2Cを組み込む
 from machine import deepsleep                   # deepsleepを組み込む
 from utime import sleep                         # μtimeからsleepを組み込む
+from utime import sleep_ms, ticks_ms, ticks_diff    # 動作時間の測定に使用
 import network                                  # ネットワーク通信
 import usocket                                  # μソケット通信
+import ustruct                                  # バイナリ形式の生成に使用
+from wbgt_fixed import coef_fixed, temp100, hum100, wbgt100, fmt1   # 整数演算版
+from sht31 import words                         # SHT31受信データの確認(CRC)
+try:
+    from machine import RTC                     # RTCメモリ(ESP32等)
+    rtc_mem = RTC().memory
+except Exception:                               # Pico はRTCメモリなし(Flashへ)
+    rtc_mem = None
 
 wifi = Pin(23, Pin.OUT)                         # 無線LANモジュールの電源ピン
 led = Pin("LED", Pin.OUT)                       # Pico W LED用ledを生成
@@ -57,72 +93,197 @@ vdd = Pin(3, Pin.OUT)                           # GP3をSHT31のV+ピンに接
 vdd.value(1)                                    # V+用に3.3Vを出力
 i2c = I2C(0, scl=Pin(5), sda=Pin(4))            # GP5をSHT31のSCLに,GP4をSDAに
 
-if len(SSID) > 0:
+def wlan_start():                               # 無線LANに接続を開始する
     wifi.value(1)                               # Wi-Fi電源ON
     wlan = network.WLAN(network.STA_IF)         # 無線LAN用のwlanを生成
     wlan.active(True)                           # 無線LANを起動
+    if ip_cache:
+        wlan.ifconfig(tuple(ip_cache[:4]))      # 前回のIPアドレスでDHCPを省略
     wlan.connect(SSID, PASS)                    # 無線LANに接続
-    while not wlan.isconnected():               # 接続待ち
+    while not low_latency and not wlan.isconnected():   # 接続待ち
         print('.', end='')                      # 接続中表示
         led.toggle()                            # LEDの点灯／非点灯の反転
         sleep(1)                                # 1秒間の待ち時間処理
-    print(wlan.ifconfig()[0])                   # IPアドレスを表示
+    if not low_latency:
+        print(wlan.ifconfig()[0])               # IPアドレスを表示
+    return wlan
+
+def buf_load():                                 # 蓄積データを読み込む
+    if rtc_mem:
+        return bytes(rtc_mem())
+    try:
+        with open(buf_file, 'rb') as f:
+            return f.read()
+    except Exception:                           # 初回は保存ファイルなし
+        return b''
+
+def buf_save(buf):                              # 蓄積データを保存する
+    if rtc_mem:
+        rtc_mem(buf)
+    else:
+        with open(buf_file, 'wb') as f:
+            f.write(buf)
+
+t_start = ticks_ms()                            # 起動時刻(動作時間の測定用)
+ip_cache = None                                 # 保存済みのIPアドレス等
+if low_latency:
+    i2c.writeto_mem(sht31,0x24,b'\x00')         # 測定を開始(無線LAN接続と並行)
+    t_meas = ticks_ms()                         # 測定開始時刻
+    try:
+        with open(ip_cache_file) as f:
+            ip_cache = f.read().split(',')      # IP,マスク,ゲートウェイ,DNS,回数
+        if len(ip_cache) != 5 or int(ip_cache[4]) >= ip_cache_n:
+            ip_cache = None                     # 期限切れ(DHCPで取得し直す)
+    except Exception:                           # 初回は保存ファイルなし
+        ip_cache = None
+
+wlan = None
+if len(SSID) > 0 and batch_n <= 1:              # 蓄積しない時は直ぐに接続
+    wlan = wlan_start()
 led.value(1)                                    # LEDをONにする
 
-temp = 0.                                       # 温度値用の変数tempを生成
-hum  = 0.                                       # 湿度値用の変数humを生成
+temp = 0                                        # 温度値(0.01℃単位)の変数temp
+hum  = 0                                        # 湿度値(0.01％単位)の変数hum
+temp_raw = 0                                    # SHT31の温度ワード
+hum_raw  = 0                                    # SHT31の湿度ワード
+lux_raw  = 0xFFFF                               # BH1750の照度ワード(0xFFFF=無し)
 
-i2c.writeto_mem(sht31,0x24,b'\x00')             # SHT31にコマンド0x2400を送信
-# i2c.writeto(sht31,b'\x24\x00')                # SHT31仕様に合わせた2バイト表記
-sleep(0.018)                                    # SHT31の測定待ち時間
-data = i2c.readfrom_mem(sht31,0x00,6)           # SHT31から測定値6バイトを受信
-if len(data) >= 5:                              # 受信データが5バイト以上の時
-    temp = float((data[0]<<8) + data[1]) / 65535. * 175. - 45.
-    hum  = float((data[3]<<8) + data[4]) / 65535. * 100.
-    payload = (data[1]<<24) + (data[0]<<16) + (data[4]<<8) + data[3]
-if wbgt_ver == 3 and wbgt_wide == False:
-    wbgt = 0.687 * temp + 0.0360 * hum + 0.00367 * temp * hum - 2.062
-elif wbgt_ver == 3 and wbgt_wide == True:
-    wbgt = 0.725 * temp + 0.0368 * hum + 0.00364 * temp * hum - 3.246
-elif wbgt_ver == 4 and wbgt_wide == False:
-    wbgt = 0.724 * temp + 0.0342 * hum + 0.00277 * temp * hum - 3.007
-elif wbgt_ver == 4 and wbgt_wide == True:
-    wbgt = 0.754 * temp + 0.0382 * hum + 0.00264 * temp * hum - 3.965
+if low_latency:                                 # 測定開始から18ms経過を待つ
+    sleep_ms(max(0, 18 - ticks_diff(ticks_ms(), t_meas)))
 else:
+    i2c.writeto_mem(sht31,0x24,b'\x00')         # SHT31にコマンド0x2400を送信
+    # i2c.writeto(sht31,b'\x24\x00')            # SHT31仕様に合わせた2バイト表記
+    sleep(0.018)                                # SHT31の測定待ち時間
+data = i2c.readfrom_mem(sht31,0x00,6)           # SHT31から測定値6バイトを受信
+res = words(data)                               # CRC確認後の生データ又は None
+if res is None:                                 # CRC不一致の時は送信しない
+    print("ERROR:SHT31の受信データが不正")
+    wifi.value(0)                               # Wi-Fi電源OFF
+    led.value(0)                                # LEDをOFFにする
+    deepsleep(interval*1000)                    # ディープスリープの開始
+temp_raw, hum_raw = res
+if bh1750:
+    data = i2c.readfrom_mem(bh1750,0x21,2)      # BH1750から照度値2バイトを受信
+    if len(data) == 2:
+        lux_raw = (data[0]<<8) + data[1]
+
+try:
+    coef = coef_fixed(wbgt_ver, wbgt_wide)      # WBGT係数(整数)を取得
+except KeyError:                                # 係数表に無いとき
     print("ERROR:WBGTバージョンが不正")
     sleep(30)                                   # 30秒間の待機
     led.value(0)                                # LEDをOFFにする
     deepsleep(interval*1000)                    # ディープスリープの開始
-temp_s = str(round(temp,1))                     # 小数点第1位で丸めて文字列に
-print('Temperature =',temp_s, end=', ')         # 温度値を表示
-hum_s = str(round(hum,1))                       # 小数点第1位で丸めて文字列に
-print('Humidity =',hum_s, end=', ')             # 湿度値を表示
-wbgt_s = str(round(wbgt,1))                     # 小数点第1位で丸めて文字列に
-print('WBGT =',wbgt_s)                          # WBGT値を表示
-sleep(0.1)                                      # シリアル出力の完了待ち
+
+if (batch_n > 1 or udp_format == 'bin') and len(device_s.encode()) > 16:
+    print("ERROR:device_sが16バイトを超えています")  # 切り詰めずに停止する
+    sleep(30)                                   # 30秒間の待機
+    led.value(0)                                # LEDをOFFにする
+    deepsleep(interval*1000)                    # ディープスリープの開始
+
+if batch_n > 1:                                 # 蓄積して一括送信する時
+    buf = buf_load()                            # 次の順序番号(2)+レコード(6)*n
+    if len(buf) < 2 or (len(buf) - 2) % 6:
+        buf = b'\x00\x00'                       # 初回または破損時
+    buf += ustruct.pack('<HHH', temp_raw, hum_raw, lux_raw)
+    n = (len(buf) - 2) // 6                     # 蓄積件数
+    if n > batch_max:                           # 上限を超えた時は古い値を破棄
+        seq = (ustruct.unpack('<H', buf[:2])[0] + 1) & 0xFFFF
+        buf = ustruct.pack('<H', seq) + buf[8:]
+        n = batch_max
+    wbgt = wbgt100(temp100(temp_raw), hum100(hum_raw), coef)
+    print('buffered', n, '/', batch_n, 'raw =', hex(temp_raw), hex(hum_raw))
+    if len(SSID) == 0 or (n < min(batch_n, batch_max) and
+                          wbgt < int(alert_wbgt * 100)):
+        buf_save(buf)                           # 送信せずに保存
+        led.value(0)                            # LEDをOFFにする
+        print('active time =', ticks_diff(ticks_ms(), t_start), 'ms')
+        deepsleep(interval*1000)                # ディープスリープの開始
+    seq = ustruct.unpack('<H', buf[:2])[0]      # 先頭レコードの順序番号
+    udp_bytes = ustruct.pack('<2sBB16sHH', b'\xa5W', 2, n, device_s.encode(),
+                             seq, interval) + buf[2:]
+    seq = (seq + n - 1) & 0xFFFF                # 最終レコードの順序番号
+elif udp_format == 'bin':                       # バイナリ形式(WBGT計算なし)
+    seq = 0                                     # 順序番号
+    try:
+        with open(seq_file, 'rb') as f:
+            seq = (ustruct.unpack('<H', f.read(2))[0] + 1) & 0xFFFF
+    except Exception:                           # 初回は保存ファイルなし
+        pass
+    print('seq =',seq,'raw =',hex(temp_raw),hex(hum_raw),hex(lux_raw))
+    udp_bytes = ustruct.pack('<2sBB16sHHHH', b'\xa5W', 1, 1, device_s.encode(),
+                             seq, temp_raw, hum_raw, lux_raw)
+else:
+    temp = temp100(temp_raw)                    # 整数演算で温度を計算
+    hum  = hum100(hum_raw)                      # 整数演算で湿度を計算
+    wbgt = wbgt100(temp, hum, coef)             # 整数演算でWBGTを計算
+    temp_s = fmt1(temp)                         # 小数点第1位で丸めて文字列に
+    print('Temperature =',temp_s, end=', ')     # 温度値を表示
+    hum_s = fmt1(hum)                           # 小数点第1位で丸めて文字列に
+    print('Humidity =',hum_s, end=', ')         # 湿度値を表示
+    wbgt_s = fmt1(wbgt)                         # 小数点第1位で丸めて文字列に
+    print('WBGT =',wbgt_s)                      # WBGT値を表示
+
+    # CSVxUDP形式 https://bokunimo.net/iot/CSVxUDP/
+    udp_s = device_s + ', ' + temp_s            # 表示用の文字列変数udp
+    udp_s += ',' + hum_s
+    udp_s += ',' + wbgt_s
+    # print('send :', udp_s)                    # 受信データを出力
+    udp_bytes = (udp_s + '\n').encode()         # バイト列に変換
+if not low_latency:
+    sleep(0.1)                                  # シリアル出力の完了待ち
 
 if len(SSID) == 0:
     led.value(0)                                # LEDをOFFにする
     deepsleep(interval*1000)                    # ディープスリープの開始
 
-# CSVxUDP送信 https://bokunimo.net/iot/CSVxUDP/
-sock = usocket.socket(usocket.AF_INET,usocket.SOCK_DGRAM) # μソケット作成
-udp_s = device_s + ', ' + temp_s                # 表示用の文字列変数udp
-udp_s += ',' + hum_s
-udp_s += ',' + wbgt_s
-# print('send :', udp_s)                        # 受信データを出力
-udp_bytes = (udp_s + '\n').encode()             # バイト列に変換
+if wlan is None:                                # 蓄積データの送信時に接続
+    wlan = wlan_start()
+if low_latency:                                 # 10ms間隔で接続を確認
+    while not wlan.isconnected():
+        if ticks_diff(ticks_ms(), t_start) > wifi_timeout:
+            print('Wi-Fi timeout')              # 接続できなかった時
+            try:
+                import os
+                os.remove(ip_cache_file)        # 保存済みのIPアドレスを破棄
+            except Exception:
+                pass
+            if batch_n > 1:
+                buf_save(buf)                   # 次回に再送する
+            wlan.active(False)                  # Wi-Fi無効化
+            wifi.value(0)                       # Wi-Fi電源OFF
+            led.value(0)                        # LEDをOFFにする
+            deepsleep(interval*1000)            # ディープスリープの開始
+        sleep_ms(10)
+    with open(ip_cache_file, 'w') as f:         # IPアドレス等と使用回数を保存
+        if ip_cache:
+            f.write(','.join(ip_cache[:4] + [str(int(ip_cache[4]) + 1)]))
+        else:                                   # DHCPで得たIPアドレス等
+            f.write(','.join(wlan.ifconfig()) + ',0')
+    print('connected', ticks_diff(ticks_ms(), t_start), 'ms')
 
+sock = usocket.socket(usocket.AF_INET,usocket.SOCK_DGRAM) # μソケット作成
+sent = False                                    # 送信の成否
 try:
     sock.sendto(udp_bytes,(udp_to,udp_port))    # UDPブロードキャスト送信
+    sent = True
 except Exception as e:                          # 例外処理発生時
     print(e)                                    # エラー内容を表示
 sock.close()                                    # ソケットの切断
+if batch_n > 1:
+    if sent:
+        buf_save(ustruct.pack('<H', (seq + 1) & 0xFFFF))    # 蓄積データを消去
+    else:
+        buf_save(buf)                           # 次回に再送する
+elif udp_format == 'bin':
+    with open(seq_file, 'wb') as f:             # 順序番号を保存
+        f.write(ustruct.pack('<H', seq))
 
 wlan.disconnect()                               # Wi-Fi切断
 wlan.active(False)                              # Wi-Fi無効化
 wifi.value(0)                                   # Wi-Fi電源OFF
 led.value(0)                                    # LEDをOFFにする
+print('active time =', ticks_diff(ticks_ms(), t_start), 'ms')    # 動作時間
 deepsleep(interval*1000)                        # ディープスリープの開始
 
 ###############################################################################
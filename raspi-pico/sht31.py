@@ -0,0 +1,47 @@
+################################################################################
+# 温湿度センサ SENSIRION SHT31 の受信データ(6バイト)の CRC を確認します。
+# for Raspberry Pi Pico / Pico W / Pico 2 (MicroPython), PC (Python3)
+#
+# 受信データ：温度(2バイト), CRC(1バイト), 湿度(2バイト), CRC(1バイト)
+#
+# ・words()  CRCを確認して温度・湿度の生データ(16ビット)を応答します。
+#            CRC不一致や受信データ不足の時は None を応答します。
+#            整数演算版(wbgt_fixed.py)の temp100(), hum100() と組み合わせます。
+# ・CMD_*    SHT31 のコマンド (単発測定, 定期測定, 読み出し, 停止)
+#
+# raspi/sht31.py の Pico 用の部分(同じ処理)です。example04_wbgt.py 等と共に
+# wbgt_fixed.py, sht31.py を Pico に保存してください。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+FRAME_SIZE = 6                          # 1回分の受信データ長
+
+CMD_SINGLE = (0x24, 0x00)               # 単発測定(高再現性)
+CMD_PERIODIC = {                        # 定期測定(高再現性)
+    0.5: (0x20, 0x32),                  # 0.5回/秒
+    1:   (0x21, 0x30),                  # 1回/秒
+    2:   (0x22, 0x36),                  # 2回/秒
+    4:   (0x23, 0x34),                  # 4回/秒
+    10:  (0x27, 0x37),                  # 10回/秒
+}
+CMD_FETCH = (0xE0, 0x00)                # 定期測定値の読み出し
+CMD_BREAK = (0x30, 0x93)                # 定期測定の停止
+
+def crc8(d1, d2):                       # CRC-8 多項式0x31 初期値0xFF
+    crc = 0xFF ^ d1
+    for i in range(16):
+        if i == 8:
+            crc ^= d2
+        if crc & 0x80:
+            crc = ((crc << 1) ^ 0x31) & 0xFF
+        else:
+            crc = (crc << 1) & 0xFF
+    return crc
+
+def words(data):
+    if len(data) < FRAME_SIZE:          # 受信データ不足
+        return None
+    if crc8(data[0], data[1]) != data[2] or crc8(data[3], data[4]) != data[5]:
+        return None                     # CRC不一致
+    return (data[0] << 8) + data[1], (data[3] << 8) + data[4]
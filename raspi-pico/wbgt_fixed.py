@@ -0,0 +1,69 @@
+################################################################################
+# SHT31 の生データ(16ビット)から整数演算のみで温度・湿度・WBGT を計算します。
+# for Raspberry Pi Pico / Pico W / Pico 2 (MicroPython), PC (Python3)
+#
+# 浮動小数点演算を持たないマイコンでの計算時間を短縮するための固定小数点版
+# です。温度・湿度・WBGT は 0.01 単位の整数(例：2953 = 29.53℃)で応答します。
+# 途中の値は全て ±2^30 未満に収まるため、MicroPython の小さな整数(small int)
+# の範囲で計算します(メモリ確保が発生しません)。
+#
+#   T100 = t_raw * 17500 / 65535 - 4500
+#   H100 = h_raw * 10000 / 65535
+#   W100 = a * T100 + b * H100 + c / 100 * T100 * H100 + 100 * d
+#   係数 a, b, c/100, d は 2^15 倍(c は 2^28 倍)した整数で計算します。
+#
+# 浮動小数点版(raspi/wbgt_calc.py)との誤差 (生データの全組み合わせ 2^32 通り
+# を wbgt_fixed_check.py で確認, 単位 0.01)
+#   温度 |T100 - 100*temp| <= 0.50, 湿度 |H100 - 100*hum| <= 0.50
+#   WBGT |W100 - 100*wbgt| <= 1.71 (Ver.3), 1.48 (Ver.3 Wide),
+#                             1.42 (Ver.4), 1.37 (Ver.4 Wide)
+#
+# 使用例：
+#   from wbgt_fixed import coef_fixed, temp100, hum100, wbgt100, fmt1
+#   coef = coef_fixed(3, True)
+#   t = temp100(t_raw); h = hum100(h_raw); w = wbgt100(t, h, coef)
+#   print('WBGT =', fmt1(w))
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+WBGT_COEF = {                           # WBGT係数表 (a, b, c, d)
+    (3, False): (0.687, 0.0360, 0.00367, -2.062),
+    (3, True):  (0.725, 0.0368, 0.00364, -3.246),
+    (4, False): (0.724, 0.0342, 0.00277, -3.007),
+    (4, True):  (0.754, 0.0382, 0.00264, -3.965),
+}
+SHIFT = 15                              # 係数の小数部のビット数
+P_SHIFT = 13                            # T100*H100 を縮める ビット数
+
+def coef_fixed(wbgt_ver=3, wbgt_wide=True):
+    # 係数表を整数に変換する(起動時に1回だけ浮動小数点演算を行う)
+    a, b, c, d = WBGT_COEF[(wbgt_ver, wbgt_wide)]
+    s = 1 << SHIFT
+    return (int(round(a * s)), int(round(b * s)),
+            int(round(c / 100. * (1 << (SHIFT + P_SHIFT)))),
+            int(round(100. * d * s)))
+
+def temp100(t_raw):                     # 温度(0.01℃単位)
+    x = t_raw * 4375                    # 17500 / 4 (65536 で割る前提)
+    x += x >> 16                        # 65536 / 65535 倍の補正
+    return ((x + 8192) >> 14) - 4500
+
+def hum100(h_raw):                      # 湿度(0.01％単位)
+    x = h_raw * 625                     # 10000 / 16 (65536 で割る前提)
+    x += x >> 16                        # 65536 / 65535 倍の補正
+    return (x + 2048) >> 12
+
+def wbgt100(t100, h100, coef):          # WBGT(0.01℃単位)
+    a, b, c, d = coef
+    acc = a * t100 + b * h100 + c * ((t100 * h100) >> P_SHIFT) + d
+    return (acc + (1 << (SHIFT - 1))) >> SHIFT
+
+def wbgt100_raw(t_raw, h_raw, coef):    # SHT31の生データからWBGTを計算
+    return wbgt100(temp100(t_raw), hum100(h_raw), coef)
+
+def fmt1(x100):                         # 0.01単位の整数を小数点第1位の文字列に
+    q = (x100 + 5) // 10                # 四捨五入(0.1単位)
+    s = '-' if q < 0 else ''
+    q = abs(q)
+    return s + str(q // 10) + '.' + str(q % 10)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# wbgt_fixed.py (整数演算版) と浮動小数点版の誤差を PC 上で確認します。
+#
+# SHT31 の温度・湿度の生データの全組み合わせ(65536 x 65536 通り)について、
+# wbgt_fixed.py と同じ整数演算を NumPy で一括計算し、浮動小数点版との最大
+# 誤差と、途中の値が MicroPython の small int (±2^30) に収まることを確認します。
+# また、無作為に選んだ値で wbgt_fixed.py の関数と結果が一致することを確認します。
+# 誤差が wbgt_fixed.py に記載の上限(ERR_*)を超えた時は NG を表示し、終了コード
+# 1 で終了します(SHIFT, P_SHIFT や係数を変更した時の確認用)。
+#
+# 使用方法 (PC 上で実行, NumPy が必要)：
+#   ./wbgt_fixed_check.py           全組み合わせ(数分かかります)
+#   ./wbgt_fixed_check.py 16        生データを16おきに間引いて確認
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import sys
+import random
+import numpy as np
+import wbgt_fixed as wf
+
+SMALL_INT = 1 << 30                                 # MicroPython small int の範囲
+ERR_T = 0.50                                        # 温度の誤差の上限(0.01単位)
+ERR_H = 0.50                                        # 湿度の誤差の上限(0.01単位)
+ERR_W = {                                           # WBGTの誤差の上限(0.01単位)
+    (3, False): 1.71,
+    (3, True):  1.48,
+    (4, False): 1.42,
+    (4, True):  1.37,
+}
+
+def temp100_np(t_raw):
+    x = t_raw * 4375
+    x += x >> 16
+    return ((x + 8192) >> 14) - 4500
+
+def hum100_np(h_raw):
+    x = h_raw * 625
+    x += x >> 16
+    return (x + 2048) >> 12
+
+def check(key, step=1, rows=64):
+    coef = wf.coef_fixed(*key)
+    a, b, c, d = wf.WBGT_COEF[key]
+    A, B, C, D = coef
+    raw = np.arange(0, 65536, step, dtype=np.int64)
+    t100 = temp100_np(raw)
+    h100 = hum100_np(raw)
+    temp = raw / 65535. * 175. - 45.
+    hum = raw / 65535. * 100.
+    err_t = np.abs(t100 - 100. * temp).max()
+    err_h = np.abs(h100 - 100. * hum).max()
+    err_w = 0.
+    acc_max = 0
+    for i in range(0, len(raw), rows):              # 温度 rows 件ずつ
+        t = t100[i:i + rows, None]
+        tf = temp[i:i + rows, None]
+        p = t * h100[None, :]
+        acc_max = max(acc_max, int(np.abs(p).max()))
+        acc = A * t + B * h100[None, :] + C * (p >> wf.P_SHIFT) + D
+        acc_max = max(acc_max, int(np.abs(acc).max()))
+        w100 = (acc + (1 << (wf.SHIFT - 1))) >> wf.SHIFT
+        ref = a * tf + b * hum[None, :] + c * tf * hum[None, :] + d
+        err_w = max(err_w, float(np.abs(w100 - 100. * ref).max()))
+    # wbgt_fixed.py の関数と一致することを確認する
+    for n in range(10000):
+        i = random.randrange(len(raw))
+        j = random.randrange(len(raw))
+        acc = A * int(t100[i]) + B * int(h100[j]) \
+            + C * ((int(t100[i]) * int(h100[j])) >> wf.P_SHIFT) + D
+        w = (acc + (1 << (wf.SHIFT - 1))) >> wf.SHIFT
+        assert wf.temp100(int(raw[i])) == t100[i]
+        assert wf.hum100(int(raw[j])) == h100[j]
+        assert wf.wbgt100_raw(int(raw[i]), int(raw[j]), coef) == w
+    return err_t, err_h, err_w, acc_max
+
+if __name__ == "__main__":
+    step = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    ng = 0
+    for key in sorted(wf.WBGT_COEF):
+        err_t, err_h, err_w, acc_max = check(key, step)
+        res = []
+        if err_t > ERR_T:
+            res.append('temp')
+        if err_h > ERR_H:
+            res.append('hum')
+        if err_w > ERR_W.get(key, 0.):
+            res.append('wbgt')
+        if acc_max >= SMALL_INT:
+            res.append('small int 超過')
+        print("Ver.%d Wide=%-5s 誤差(0.01単位) temp=%.3f hum=%.3f wbgt=%.3f"
+              % (key[0], key[1], err_t, err_h, err_w), end=', ')
+        print("max|acc| = %d (%s)" % (acc_max,
+              'NG ' + ', '.join(res) if res else 'OK'))
+        ng += len(res)
+    sys.exit(1 if ng else 0)
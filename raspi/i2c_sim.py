@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# I2C センサの模擬装置 (smbus.SMBus の代わりに使用します)
+#
+# 実機が無くても raspi/ のスクリプトやスケジューラを動作確認できるように、
+# SHT31 と BH1750FVI の変換時間を含めた動作を模擬します。
+#
+# ・FakeSMBus  smbus.SMBus と同じメソッド(write_byte_data, write_byte,
+#              read_i2c_block_data)を持つ模擬バス
+# ・SimSHT31   温湿度センサ。変換中に読み出すと OSError (NACK) になります
+#              定期測定(0.5〜10回/秒)では mps 回/秒で測定を繰り返し、fetch
+#              (0xE000)で最新値を応答します。新しい測定値が無ければ NACK です
+# ・SimBH1750  照度センサ。読み出し時は直前に変換を終えた値を応答します
+# ・SimClock   時刻を進めるだけの模擬時計 (sleep しても待ち時間無し)
+#
+# 使用例：
+#   bus = FakeSMBus(1)
+#   bus.add(SimSHT31(0x44, temp=29.2, hum=70.))
+#   bus.write_byte_data(0x44, 0x24, 0x00)
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+from time import monotonic
+import errno
+from sht31 import crc8, CMD_PERIODIC
+
+class SimClock:                                     # 模擬時計
+    def __init__(self, t=0.):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, sec):
+        if sec > 0:
+            self.t += sec
+
+class SimSHT31:                                     # 模擬 SHT31
+    conversion_time = 0.0155                        # 高再現性の最大変換時間(秒)
+
+    def __init__(self, addr=0x44, temp=25., hum=50.):
+        self.addr = addr
+        self.temp = temp                            # 模擬する温度(℃)
+        self.hum = hum                              # 模擬する湿度(％)
+        self.clock = monotonic
+        self.ready_at = None                        # 変換完了時刻
+        self.commands = 0                           # 受信コマンド数
+        self.reads = 0                              # 読み出し数
+        self.mps = None                             # 定期測定の回数/秒
+        self.periodic_at = None                     # 定期測定の開始時刻
+        self.fetched = -1                           # 読み出し済みの測定番号
+        self.fetch_cmd = False                      # fetch コマンド受信済み
+        self.age = None                             # 読み出した値の経過時間(秒)
+
+    def raw(self):
+        t = int(round((self.temp + 45.) / 175. * 65535.))
+        h = int(round(self.hum / 100. * 65535.))
+        t = min(max(t, 0), 65535)
+        h = min(max(h, 0), 65535)
+        return [t >> 8, t & 0xFF, crc8(t >> 8, t & 0xFF),
+                h >> 8, h & 0xFF, crc8(h >> 8, h & 0xFF)]
+
+    def write(self, cmd, arg):
+        self.commands += 1
+        if self.mps is not None:                    # 定期測定中
+            if (cmd, arg) == (0xE0, 0x00):          # fetch
+                self.fetch_cmd = True
+            elif (cmd, arg) in ((0x30, 0x93), (0x30, 0xA2)):   # 停止, リセット
+                self.mps = None
+            return                                  # 他のコマンドは無視
+        if (cmd, arg) == (0x24, 0x00):              # 単発測定(高再現性)
+            self.ready_at = self.clock() + self.conversion_time
+        for mps, c in CMD_PERIODIC.items():
+            if (cmd, arg) == c:                     # 定期測定の開始
+                self.mps = mps
+                self.periodic_at = self.clock()
+                self.fetched = -1
+                self.fetch_cmd = False
+
+    def _latest(self):
+        # 定期測定で最後に変換を終えた測定の番号と完了時刻
+        t = self.clock() - self.periodic_at - self.conversion_time
+        if t < 0:
+            return -1, None
+        k = int(t * self.mps)
+        return k, self.periodic_at + self.conversion_time + k / self.mps
+
+    def read(self, cmd, length):
+        self.reads += 1
+        if self.mps is not None:
+            k, t_done = self._latest()
+            if not self.fetch_cmd or k <= self.fetched:
+                self.fetch_cmd = False
+                raise OSError(errno.EREMOTEIO, 'Remote I/O error')  # 新値なし
+            self.fetch_cmd = False
+            self.fetched = k
+            self.age = self.clock() - t_done
+            return self.raw()[:length]
+        if self.ready_at is None or self.clock() < self.ready_at:
+            raise OSError(errno.EREMOTEIO, 'Remote I/O error')  # 変換中はNACK
+        self.age = self.clock() - self.ready_at
+        self.ready_at = None
+        return self.raw()[:length]
+
+class SimBH1750:                                    # 模擬 BH1750FVI
+    conversion_time = 0.180                         # 高分解能の最大変換時間(秒)
+
+    def __init__(self, addr=0x23, lux=1000.):
+        self.addr = addr
+        self.lux = lux                              # 模擬する照度(lx)
+        self.clock = monotonic
+        self.ready_at = None
+        self.value = 0                              # 変換済みの値
+        self.commands = 0
+        self.reads = 0
+
+    def _update(self):
+        if self.ready_at is not None and self.clock() >= self.ready_at:
+            self.value = min(int(round(self.lux * 1.2)), 65535)
+            self.ready_at = None
+
+    def write(self, cmd, arg=None):
+        self.commands += 1
+        self._update()
+        if cmd in (0x20, 0x21, 0x10, 0x11):         # 高分解能モード
+            self.ready_at = self.clock() + self.conversion_time
+
+    def read(self, cmd, length):
+        self.reads += 1
+        self._update()
+        data = [self.value >> 8, self.value & 0xFF]
+        self.write(cmd)                             # 読み出し時のコマンド送信
+        return data[:length]
+
+class FakeSMBus:                                    # 模擬 smbus.SMBus
+    def __init__(self, bus=1, clock=monotonic, xfer_time=0.):
+        self.bus = bus
+        self.clock = clock
+        self.xfer_time = xfer_time                  # 1回の通信時間(SimClock用)
+        self.transfers = 0                          # 通信回数
+        self.devices = {}
+
+    def add(self, device):
+        device.clock = self.clock
+        self.devices[device.addr] = device
+        return device
+
+    def _device(self, addr):
+        self.transfers += 1
+        if self.xfer_time:
+            self.clock.sleep(self.xfer_time)
+        try:
+            return self.devices[addr]
+        except KeyError:
+            raise OSError(errno.EREMOTEIO, 'Remote I/O error')  # 応答なし
+
+    def write_byte(self, addr, value):
+        self._device(addr).write(value, None)
+
+    def write_byte_data(self, addr, cmd, value):
+        self._device(addr).write(cmd, value)
+
+    def read_i2c_block_data(self, addr, cmd, length=32):
+        return self._device(addr).read(cmd, length)
+
+    def close(self):
+        pass
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# 複数センサの測定スケジューラ
+#
+# 全センサ(複数の SHT31 0x44/0x45, BH1750FVI, 複数の I2C バス)に測定開始の
+# コマンドを一斉に送信し、各センサの変換時間が経過した順に読み出します。
+# 測定周期は開始時刻からの倍数で管理するため、処理時間による周期のずれが
+# 累積しません。処理が周期に間に合わなかった時は、次の周期まで待ちます。
+#
+# 使用方法：
+#   ./sensor_scheduler.py           実機(smbus)で動作
+#   ./sensor_scheduler.py sim       模擬装置(i2c_sim.py)で動作
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+# センサ設定 (I2Cバス番号, 種類, I2Cアドレス)
+sensors_conf = [
+    (1, 'sht31', 0x44),
+    (1, 'sht31', 0x45),
+    (1, 'bh1750', 0x23),
+]
+period = 1.0                                        # 測定周期(秒)
+wbgt_ver = 3                                        # WBGTバージョン 3または4
+wbgt_wide = True                                    # 筆者の独自拡張Wide版
+
+from time import monotonic, sleep
+import sht31 as sht31_decoder                       # SHT31受信データの変換処理
+
+class SHT31Sensor:
+    conversion_time = 0.016                         # 高再現性の変換時間(秒)
+
+    def __init__(self, bus, addr=0x44, name=None):
+        self.bus = bus
+        self.addr = addr
+        self.name = name or 'sht31_%02x' % addr
+
+    def trigger(self):
+        self.bus.write_byte_data(self.addr, 0x24, 0x00) # 単発測定(高再現性)
+
+    def collect(self):
+        data = self.bus.read_i2c_block_data(self.addr, 0x00, 6)
+        return sht31_decoder.decode(data)           # (温度, 湿度) 又は None
+
+class BH1750Sensor:
+    conversion_time = 0.180                         # 高分解能の最大変換時間(秒)
+
+    def __init__(self, bus, addr=0x23, name=None):
+        self.bus = bus
+        self.addr = addr
+        self.name = name or 'bh1750_%02x' % addr
+
+    def trigger(self):
+        self.bus.write_byte(self.addr, 0x21)        # 1回測定(高分解能)
+
+    def collect(self):
+        data = self.bus.read_i2c_block_data(self.addr, 0x21, 2)
+        if len(data) != 2:
+            return None
+        return float((data[0] << 8) + data[1]) / 1.2
+
+class Scheduler:
+    def __init__(self, sensors, period=period, clock=monotonic, sleep=sleep):
+        self.sensors = list(sensors)
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.errors = 0                             # I2C通信エラー数
+        self.overruns = 0                           # 周期に間に合わなかった数
+        # 変換時間の短い順に読み出す
+        self._order = sorted(self.sensors, key=lambda s: s.conversion_time)
+
+    def sample(self):
+        # 全センサの測定を開始し、変換を終えた順に読み出す
+        results = dict.fromkeys(s.name for s in self.sensors)  # 設定順
+        t_start = {}
+        for s in self.sensors:
+            try:
+                s.trigger()
+                t_start[s] = self.clock()
+            except OSError:
+                self.errors += 1
+        for s in self._order:
+            if s not in t_start:
+                continue
+            wait = t_start[s] + s.conversion_time - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+            try:
+                results[s.name] = s.collect()
+            except OSError:
+                self.errors += 1
+                results[s.name] = None
+        return results
+
+    def run(self, callback, count=None):
+        # callback(周期の開始時刻, 結果の辞書) を period 秒毎に呼び出す
+        t0 = self.clock()
+        k = 0                                       # 周期の番号
+        n = 0                                       # 測定回数
+        while count is None or n < count:
+            t_slot = t0 + k * self.period
+            callback(t_slot, self.sample())
+            k += 1
+            n += 1
+            t_next = t0 + k * self.period
+            now = self.clock()
+            if now > t_next:                        # 周期に間に合わなかった時
+                skip = int((now - t_next) // self.period) + 1
+                self.overruns += skip
+                k += skip
+                t_next = t0 + k * self.period
+            self.sleep(t_next - now)
+
+def make_sensors(conf, open_bus):
+    buses = {}
+    sensors = []
+    for bus_no, kind, addr in conf:
+        if bus_no not in buses:
+            buses[bus_no] = open_bus(bus_no)
+        cls = SHT31Sensor if kind == 'sht31' else BH1750Sensor
+        name = '%s_%d_%02x' % (kind, bus_no, addr)
+        sensors.append(cls(buses[bus_no], addr, name))
+    return sensors
+
+if __name__ == "__main__":
+    import sys
+    from wbgt_calc import wbgt
+    if len(sys.argv) > 1 and sys.argv[1] == 'sim':
+        import i2c_sim
+        def open_bus(n):
+            bus = i2c_sim.FakeSMBus(n)
+            bus.add(i2c_sim.SimSHT31(0x44, 29.2, 70.))
+            bus.add(i2c_sim.SimSHT31(0x45, 28.5, 65.))
+            bus.add(i2c_sim.SimBH1750(0x23, 10000.))
+            return bus
+    else:
+        import smbus
+        open_bus = smbus.SMBus
+
+    def show(t, results):
+        for name, value in results.items():
+            if value is None:
+                print(name, 'ERROR', end=', ')
+            elif name.startswith('sht31'):
+                temp, hum = value
+                print("%s: Temp. = %.2f ℃, Humid. = %.0f ％, WBGT = %.2f ℃"
+                      % (name, temp, hum, wbgt(temp, hum, wbgt_ver, wbgt_wide)),
+                      end=', ')
+            else:
+                print("%s: Ilum. = %.0f lx" % (name, value), end=', ')
+        print()
+
+    sched = Scheduler(make_sensors(sensors_conf, open_bus), period)
+    try:
+        sched.run(show)
+    except KeyboardInterrupt:
+        print('errors =', sched.errors, 'overruns =', sched.overruns)
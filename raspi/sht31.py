@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# 温湿度センサ SENSIRION SHT31 の受信データ(6バイト)を温度と湿度に変換します。
+#
+# 受信データ：温度(2バイト), CRC(1バイト), 湿度(2バイト), CRC(1バイト)
+#
+# ・decode()        1回分の受信データを (温度, 湿度) に変換します。
+#                   CRC不一致や受信データ不足の時は None を応答します。
+# ・decode_frames() 複数回分の受信データを連結した bytes / memoryview から、
+#                   温度, 湿度, CRC正常フラグ の配列を一括で応答します。
+#                   NumPy があれば構造化dtypeでコピー無しに解析します。
+# ・words()         CRCを確認して温度・湿度の生データ(16ビット)を応答します。
+#                   整数演算版(raspi-pico/wbgt_fixed.py)と組み合わせて使用します。
+# ・read_single()   単発測定(0x2400)を行い、変換時間を待ってから読み出します。
+# ・start_periodic() 定期測定(0.5〜10回/秒)を開始します。以降は fetch() で
+#                   最新の測定値を待ち時間無しに読み出します。新しい測定値が
+#                   無い時(前回の fetch() 以降に測定を終えていない時)は None。
+#
+# Pico では同じ処理の raspi-pico/sht31.py (words() と CMD_* のみ) を使用します。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import struct
+
+try:
+    import numpy as np                              # NumPy(あれば使用する)
+except ImportError:
+    np = None
+
+FRAME_SIZE = 6                                      # 1回分の受信データ長
+FRAME_FORMAT = '>HBHB'                              # 温度,CRC,湿度,CRC
+if np is not None:
+    FRAME_DTYPE = np.dtype([('temp', '>u2'), ('temp_crc', 'u1'),
+                            ('hum', '>u2'), ('hum_crc', 'u1')])
+
+CMD_SINGLE = (0x24, 0x00)                           # 単発測定(高再現性)
+CMD_PERIODIC = {                                    # 定期測定(高再現性)
+    0.5: (0x20, 0x32),                              # 0.5回/秒
+    1:   (0x21, 0x30),                              # 1回/秒
+    2:   (0x22, 0x36),                              # 2回/秒
+    4:   (0x23, 0x34),                              # 4回/秒
+    10:  (0x27, 0x37),                              # 10回/秒
+}
+CMD_FETCH = (0xE0, 0x00)                            # 定期測定値の読み出し
+CMD_BREAK = (0x30, 0x93)                            # 定期測定の停止
+CONVERSION_TIME = 0.016                             # 高再現性の変換時間(秒)
+
+def crc8(d1, d2):                                   # CRC-8 多項式0x31 初期値0xFF
+    crc = 0xFF ^ d1
+    for i in range(16):
+        if i == 8:
+            crc ^= d2
+        if crc & 0x80:
+            crc = ((crc << 1) ^ 0x31) & 0xFF
+        else:
+            crc = (crc << 1) & 0xFF
+    return crc
+
+def raw2temp(raw):
+    return float(raw) / 65535. * 175. - 45.
+
+def raw2hum(raw):
+    return float(raw) / 65535. * 100.
+
+def words(data):
+    if len(data) < FRAME_SIZE:                      # 受信データ不足
+        return None
+    if crc8(data[0], data[1]) != data[2] or crc8(data[3], data[4]) != data[5]:
+        return None                                 # CRC不一致
+    return (data[0] << 8) + data[1], (data[3] << 8) + data[4]
+
+def decode(data):
+    res = words(data)
+    if res is None:
+        return None
+    return raw2temp(res[0]), raw2hum(res[1])
+
+# smbus.SMBus (又は i2c_sim.FakeSMBus) を使った測定
+def read_single(bus, addr=0x44, sleep=None):
+    if sleep is None:
+        from time import sleep
+    bus.write_byte_data(addr, *CMD_SINGLE)
+    sleep(CONVERSION_TIME + 0.002)
+    return decode(bus.read_i2c_block_data(addr, 0x00, FRAME_SIZE))
+
+def start_periodic(bus, addr=0x44, mps=1):
+    if mps not in CMD_PERIODIC:
+        raise ValueError("測定回数は %s のいずれかです" % sorted(CMD_PERIODIC))
+    bus.write_byte_data(addr, *CMD_PERIODIC[mps])
+
+def fetch(bus, addr=0x44):
+    bus.write_byte_data(addr, *CMD_FETCH)
+    try:
+        data = bus.read_i2c_block_data(addr, 0x00, FRAME_SIZE)
+    except OSError:                                 # 新しい測定値が無い(NACK)
+        return None
+    return decode(data)
+
+def stop_periodic(bus, addr=0x44):
+    bus.write_byte_data(addr, *CMD_BREAK)
+
+_crc_table = None                                   # 16ビット値毎のCRC表
+
+def _crc_table_numpy():
+    global _crc_table
+    if _crc_table is None:
+        crc = (np.arange(65536, dtype=np.uint16) >> 8).astype(np.uint8)
+        crc ^= 0xFF
+        low = (np.arange(65536, dtype=np.uint16) & 0xFF).astype(np.uint8)
+        for i in range(16):
+            if i == 8:
+                crc ^= low
+            msb = (crc & 0x80) != 0
+            crc <<= 1
+            crc[msb] ^= 0x31
+        _crc_table = crc
+    return _crc_table
+
+def _decode_frames_numpy(buf):
+    frames = np.frombuffer(buf, dtype=FRAME_DTYPE)  # コピーせずに参照する
+    table = _crc_table_numpy()
+    valid = table[frames['temp']] == frames['temp_crc']
+    valid &= table[frames['hum']] == frames['hum_crc']
+    temp = frames['temp'].astype(np.float64)
+    temp /= 65535.
+    temp *= 175.
+    temp -= 45.
+    hum = frames['hum'].astype(np.float64)
+    hum /= 65535.
+    hum *= 100.
+    return temp, hum, valid
+
+def _decode_frames_python(buf):
+    from array import array
+    temp = array('d')
+    hum = array('d')
+    valid = bytearray()
+    for t, tc, h, hc in struct.iter_unpack(FRAME_FORMAT, buf):
+        temp.append(raw2temp(t))
+        hum.append(raw2hum(h))
+        valid.append(crc8(t >> 8, t & 0xFF) == tc and crc8(h >> 8, h & 0xFF) == hc)
+    return temp, hum, valid
+
+def decode_frames(buf):
+    if len(buf) % FRAME_SIZE:
+        raise ValueError("受信データ長が %d の倍数ではありません" % FRAME_SIZE)
+    if np is not None:
+        return _decode_frames_numpy(buf)
+    return _decode_frames_python(buf)
+
+if __name__ == "__main__":
+    frame = bytes([0x66, 0x66, 0x93, 0x8F, 0x5C, 0x38])
+    print("decode =", decode(frame))                # 約25℃, 約56％
+    print("crc8(0xBE,0xEF) = 0x%02X" % crc8(0xBE, 0xEF))    # 0x92 (データシート)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# SHT31 の単発測定と定期測定の 遅延・スループット を比較します。
+#
+# ・単発測定   測定開始(0x2400)→変換待ち(約16ms)→読み出し を毎回行います。
+#              ホストは変換待ちの間ブロックされ、1回あたり2回の通信が必要です。
+# ・定期測定   SHT31 が mps 回/秒で測定を繰り返し、ホストは fetch(0xE000)で
+#              最新値を読み出します。変換待ちは不要ですが、値は最大 1/mps 秒
+#              古くなります。
+#
+# 各方式について以下を表示します。
+#   samples/s  取得できた測定値の数/秒
+#   busy       1回の取得でホストがブロックされた時間(ms)
+#   age        読み出した値の変換完了からの経過時間(ms, 模擬装置のみ)
+#   xfer       1回の取得あたりのI2C通信回数
+#
+# 使用方法：
+#   ./sht31_modes.py                模擬装置(i2c_sim.py)で比較
+#   ./sht31_modes.py real           実機(smbus)で比較(数十秒かかります)
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+sht31 = 0x44                                        # sht31 = 0x44 又は 0x45
+duration = 10.                                      # 各方式の測定時間(秒)
+host_period = 0.25                                  # 定期測定の読み出し周期(秒)
+xfer_time = 0.0005                                  # 模擬装置の1回の通信時間(秒)
+
+import sys
+import sht31 as sht31_decoder                       # SHT31の測定・変換処理
+
+class Stats:
+    def __init__(self, bus, dev):
+        self.bus = bus
+        self.dev = dev                              # 模擬装置(実機は None)
+        self.n = 0                                  # 取得できた測定値の数
+        self.busy = 0.                              # ブロックされた時間の合計
+        self.ages = []                              # 値の経過時間
+        self.xfer = 0                               # 通信回数
+
+    def measure(self, func, clock):
+        t = clock()
+        x = getattr(self.bus, 'transfers', 0)
+        res = func()
+        self.busy += clock() - t
+        self.xfer += getattr(self.bus, 'transfers', 0) - x
+        if res:
+            self.n += 1
+            if self.dev:
+                self.ages.append(self.dev.age)
+        return res
+
+    def report(self, name, duration):
+        n = self.n or 1
+        s = '%-15s samples/s = %6.2f, busy = %6.3f ms' % (
+            name, self.n / duration, self.busy / n * 1000.)
+        if self.ages:
+            s += ', age = %6.1f ms (max %6.1f)' % (
+                sum(self.ages) / len(self.ages) * 1000., max(self.ages) * 1000.)
+        if self.dev:
+            s += ', xfer = %.1f' % (self.xfer / n)
+        print(s)
+
+def run_single(bus, clock, sleep, st):
+    # 単発測定を連続して行う(最大スループット)
+    t_end = clock() + duration
+    while clock() < t_end:
+        st.measure(lambda: sht31_decoder.read_single(bus, sht31, sleep), clock)
+
+def run_periodic(bus, clock, sleep, st, mps):
+    # ホスト側の周期(host_period, 測定周期より短くはしない)で fetch する
+    period = max(host_period, 1. / mps)
+    sht31_decoder.start_periodic(bus, sht31, mps)
+    t0 = clock()
+    k = 0
+    while k * period < duration:
+        t_next = t0 + (k + 0.5) * period            # 測定周期と位相をずらす
+        if t_next > clock():
+            sleep(t_next - clock())
+        st.measure(lambda: sht31_decoder.fetch(bus, sht31), clock)
+        k += 1
+    sht31_decoder.stop_periodic(bus, sht31)
+    sleep(0.001)                                    # 停止コマンドの処理時間
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'real':
+        import smbus
+        from time import monotonic as clock, sleep
+        bus = smbus.SMBus(1)
+        dev = None
+    else:
+        import i2c_sim
+        clock = i2c_sim.SimClock()
+        sleep = clock.sleep
+        bus = i2c_sim.FakeSMBus(1, clock, xfer_time)
+        dev = bus.add(i2c_sim.SimSHT31(sht31, 29.2, 70.))
+    st = Stats(bus, dev)
+    run_single(bus, clock, sleep, st)
+    st.report('single', duration)
+    for mps in sorted(sht31_decoder.CMD_PERIODIC):
+        st = Stats(bus, dev)
+        run_periodic(bus, clock, sleep, st, mps)
+        st.report('periodic %gmps' % mps, duration)
+
+if __name__ == "__main__":
+    main()
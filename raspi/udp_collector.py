@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# CSVxUDP 受信機 (example04_wbgt_udp_le.py の受信側)
+#
+# Pico W から UDPポート1024 へ送信される「device_s, temp, hum, wbgt」形式の
+# 行を asyncio で受信し、まとめて(バッチで)解析します。
+#
+# ・不正な形式のパケットは破棄し、dropped 数を数えます
+# ・同じデバイスから同じ内容が dedupe_window 秒以内に届いた時は再送として破棄
+# ・受信したパケットを記録ファイルに保存し、udp_replay.py で再生できます
+#   (バイナリ形式のパケットは「WB:」に続く16進数の1行で保存します。16進数は
+#   カンマを含まないため、4列の CSV の行と区別できます)
+# ・バイナリ形式(wbgt_packet.py, udp_format = 'bin')のパケットも受信できます。
+#   同じデバイスから同じ順序番号が届いた時は再送として破棄します。
+# ・暑さ指数の段階(注意,警戒,厳重警戒,危険)が変化した時に表示します(wbgt_alert.py)
+#
+# 使用方法：
+#   ./udp_collector.py [記録ファイル名]
+#
+# CSVxUDP方式については下記を参照ください。
+# https://bokunimo.net/iot/CSVxUDP/
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+udp_port = 1024                                     # UDPポート番号
+batch_size = 1024                                   # 一括解析するパケット数
+flush_interval = 0.1                                # 一括解析の最大待ち時間(秒)
+dedupe_window = 5.0                                 # 再送とみなす時間(秒)
+rcvbuf = 4 * 1024 * 1024                            # ソケット受信バッファ(バイト)
+wbgt_ver = 3                                        # バイナリ形式のWBGTバージョン
+wbgt_wide = True                                    # 筆者の独自拡張Wide版
+heat_alert = True                                   # 暑さ指数の段階の変化を表示
+
+import asyncio
+import socket
+from collections import namedtuple
+from time import monotonic, time
+import wbgt_packet                                  # バイナリ形式のパケット
+from wbgt_calc import wbgt, wbgt_batch
+from wbgt_alert import AlertEngine, print_events    # 段階判定と警報
+
+RECORD_BIN = b'WB:'                                 # 記録ファイルのバイナリ形式
+
+# lux はバイナリ形式で照度センサ値がある時のみ
+Record = namedtuple('Record', ('time', 'device', 'temp', 'hum', 'wbgt', 'lux'),
+                    defaults=(None,))
+
+def parse_line(line):
+    # b'humid_3, 25.1,60.2,24.3' を (device, temp, hum, wbgt) に変換する
+    cols = line.split(b',')
+    if len(cols) != 4:
+        return None
+    device = cols[0].strip()
+    if not device or not device.isascii():
+        return None
+    try:
+        return device.decode(), float(cols[1]), float(cols[2]), float(cols[3])
+    except ValueError:
+        return None
+
+class CsvUdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback, batch_size=batch_size,
+                 flush_interval=flush_interval, dedupe_window=dedupe_window,
+                 record=None):
+        self.callback = callback                    # callback(Recordのリスト)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedupe_window = dedupe_window
+        self.record = record                        # 受信パケットの記録先
+        self.received = 0                           # 受信パケット数
+        self.accepted = 0                           # 解析に成功した行数
+        self.dropped = 0                            # 不正な形式で破棄した行数
+        self.duplicated = 0                         # 再送として破棄した行数
+        self._pending = []                          # 未解析のパケット
+        self._last = {}                             # デバイス毎の最終受信内容
+        self._last_seq = {}                         # デバイス毎の最終順序番号
+        self._timer = None
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None and rcvbuf:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            except OSError:
+                pass
+        self._schedule()
+
+    def datagram_received(self, data, addr):
+        self._pending.append(data)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def connection_lost(self, exc):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self.flush()
+
+    def _schedule(self):
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(self.flush_interval, self._on_timer)
+
+    def _on_timer(self):
+        try:
+            self.flush()
+        finally:
+            self._schedule()                        # 例外が起きても次回を予約
+
+    def flush(self):
+        pending = self._pending
+        if not pending:
+            return
+        records = self._parse(pending)
+        self._pending = self._pending[len(pending):]    # 解析後に消去する
+        self.accepted += len(records)
+        if records:
+            self.callback(records)
+
+    def _parse(self, pending):
+        # 全パケットを解析し(又は dropped に数え)、Record のリストを応答する
+        self.received += len(pending)
+        if self.record:
+            for data in pending:                    # 1パケット1行で記録する
+                if wbgt_packet.is_binary(data):
+                    data = RECORD_BIN + data.hex().encode()
+                self.record.write(data if data.endswith(b'\n') else data + b'\n')
+        binary = [p for p in pending if wbgt_packet.is_binary(p)]
+        if binary:
+            pending = [p for p in pending if not wbgt_packet.is_binary(p)]
+        now_m = monotonic()
+        now = time()
+        last = self._last
+        window = self.dedupe_window
+        records = []
+        for data in pending:
+            for line in data.splitlines():
+                if not line:
+                    continue
+                res = parse_line(line)
+                if res is None:
+                    self.dropped += 1
+                    continue
+                prev = last.get(res[0])
+                if prev and prev[0] == line and now_m - prev[1] < window:
+                    self.duplicated += 1            # 再送パケット
+                    continue
+                last[res[0]] = (line, now_m)
+                records.append(Record(now, *res))
+        if binary:
+            self._flush_binary(binary, now, records)
+        return records
+
+    def _flush_binary(self, packets, now, records):
+        last_seq = self._last_seq
+        cols, others = wbgt_packet.decode_batch(packets)
+        w = wbgt_batch(cols['temp'], cols['hum'], wbgt_ver, wbgt_wide)
+        for dev, seq, t, h, wb, lx in zip(cols['device'], cols['seq'],
+                                          cols['temp'], cols['hum'], w,
+                                          cols['lux']):
+            dev = dev.decode()
+            seq = int(seq)
+            if last_seq.get(dev) == seq:
+                self.duplicated += 1                # 再送パケット
+                continue
+            last_seq[dev] = seq
+            lx = None if lx != lx else float(lx)    # NaN は照度センサ無し
+            records.append(Record(now, dev, float(t), float(h), float(wb), lx))
+        for p in others:                            # 蓄積送信等のパケット
+            res = wbgt_packet.decode_packet(p)
+            if res is None:
+                self.dropped += 1
+                continue
+            dev, seq, recs, interval = res
+            seq = (seq + len(recs) - 1) & 0xFFFF    # 最終レコードの順序番号
+            if last_seq.get(dev) == seq:
+                self.duplicated += 1
+                continue
+            last_seq[dev] = seq
+            t_rec = now - interval * (len(recs) - 1)    # 先頭レコードの時刻
+            for t_raw, h_raw, lux_raw in recs:
+                t = float(t_raw) / 65535. * 175. - 45.
+                h = float(h_raw) / 65535. * 100.
+                lx = None if lux_raw == wbgt_packet.LUX_NONE else \
+                    wbgt_packet.raw2lux(lux_raw)
+                records.append(Record(t_rec, dev, t, h,
+                                      wbgt(t, h, wbgt_ver, wbgt_wide), lx))
+                t_rec += interval
+
+async def start(callback, port=udp_port, host='0.0.0.0', **kwargs):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: CsvUdpProtocol(callback, **kwargs),
+        local_addr=(host, port))
+    return transport, protocol
+
+def print_records(records):
+    for r in records:
+        print("%s, Temp. = %.1f ℃, Humid. = %.1f ％, WBGT = %.1f ℃"
+              % (r.device, r.temp, r.hum, r.wbgt))
+
+async def main(record_file=None):
+    record = open(record_file, 'ab') if record_file else None
+    alert = AlertEngine(sinks=[print_events]) if heat_alert else None
+    def on_records(records):
+        print_records(records)
+        if alert:
+            alert.update_records(records)
+    transport, protocol = await start(on_records, record=record)
+    print('Listening UDP port', udp_port)
+    try:
+        await asyncio.Future()                      # 終了まで待機
+    finally:
+        transport.close()
+        if record:
+            record.close()
+
+if __name__ == "__main__":
+    import sys
+    try:
+        asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None))
+    except KeyboardInterrupt:
+        print()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# CSVxUDP 再生送信機 (udp_collector.py の試験用)
+#
+# udp_collector.py が記録したファイルを1行1パケットで UDP 送信します。
+# 「WB:」で始まりカンマを含まない行は、バイナリ形式のパケット(16進数)に
+# 戻して送信します。
+# ループバック(127.0.0.1)宛に送信して受信機の動作や処理能力を確認できます。
+#
+# 使用方法：
+#   ./udp_replay.py 記録ファイル名 [送信レート(パケット/秒), 0=最大]
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+udp_to = '127.0.0.1'                                # 送信先(ループバック)
+udp_port = 1024                                     # UDPポート番号
+
+import socket
+from time import perf_counter, sleep
+
+def replay(packets, host=udp_to, port=udp_port, rate=0):
+    # packets を順に送信し、送信数を応答する (rate=0 の時は待ち時間無し)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    addr = (host, port)
+    n = 0
+    t0 = perf_counter()
+    try:
+        for data in packets:
+            if rate:
+                wait = t0 + n / rate - perf_counter()
+                if wait > 0:
+                    sleep(wait)
+            sock.sendto(data, addr)
+            n += 1
+    finally:
+        sock.close()
+    return n
+
+def load(filename):
+    with open(filename, 'rb') as f:
+        return [bytes.fromhex(line[3:].decode())
+                if line[:3] == b'WB:' and b',' not in line
+                else line for line in f if line.strip()]
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage:", sys.argv[0], "記録ファイル名 [送信レート]")
+        sys.exit(1)
+    packets = load(sys.argv[1])
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    t0 = perf_counter()
+    n = replay(packets, rate=rate)
+    dt = perf_counter() - t0
+    print("sent %d packets, %.3f s (%.0f packets/s)" % (n, dt, n / dt))
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# CSVxUDP 受信機 (複数プロセス版, 大量のデバイスからの受信用)
+#
+# N 個のワーカ・プロセスが UDPポート(1024)のパケットを udp_collector.py と
+# 同じ方法で解析します。解析結果は固定長のレコードとして共有メモリ
+# (multiprocessing.shared_memory)のリングバッファに書き込み、親プロセスが
+# コピー無し(pickle無し)で読み出します。
+#
+# ・ブロードキャスト(broadcast = True, 既定)
+#                 1個の受信プロセスが全パケットを1回だけ受信し、デバイス名の
+#                 crc32 で担当ワーカ(crc32 % N)を決めて、パケットのまま
+#                 ワーカ毎の共有メモリ(パケット用リングバッファ)へ渡します。
+#                 受信プロセスは解析しないため、解析はワーカ数に応じて分散
+#                 します。送信側がユニキャストでも全パケットを受信します。
+#                 リングバッファが満杯の時はパケットを破棄して backlog に
+#                 数えます。
+# ・ユニキャスト(broadcast = False)
+#                 各ワーカが SO_REUSEPORT で同じポートを受信し、カーネルが
+#                 送信元アドレス毎にワーカを割り当てます(受信プロセス無し)。
+#                 1回の送信(1台の1回分の起動)は常に同じワーカが受信します。
+#                 ブロードキャストのパケットは全ワーカに届き重複するため、
+#                 送信側はユニキャストにしてください。
+#
+# リングバッファ：1ワーカ毎に1個(書き込み1, 読み出し1)。満杯の時は新しい
+# レコードを破棄して overflow に数えます。デバイス名が16バイトを超える
+# レコードは(切り詰めると別のデバイスと混ざるため)破棄して long_name に
+# 数えます。
+#   ヘッダ(256バイト): 読み出し位置, 書き込み位置, 受信数等の統計(uint64)
+#   レコード(40バイト): 時刻 float64, デバイス名 16バイト,
+#                       温度, 湿度, WBGT, 照度(無い時 NaN) float32
+#   パケット用: パケット長 uint32 + パケット (4バイト境界に揃える)
+#
+# 使用方法：
+#   ./udp_sharded.py [ワーカ数]     1秒毎に受信数と処理レートを表示
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+udp_port = 1024                                     # UDPポート番号
+n_workers = 0                                       # ワーカ数(0=CPUコア数)
+broadcast = True                                    # 受信プロセスで振り分ける
+ring_records = 65536                                # リングバッファのレコード数
+packet_ring_bytes = 4 * 1024 * 1024                 # パケット用リングバッファ
+
+import asyncio
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import struct
+import zlib
+from multiprocessing import shared_memory
+import udp_collector                                # 解析処理
+import wbgt_packet                                  # バイナリ形式のパケット
+
+try:
+    import numpy as np                              # NumPy(あれば使用する)
+except ImportError:
+    np = None
+
+RECORD_FORMAT = '<d16sffff'                         # 時刻,デバイス,温湿度,WBGT,照度
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)        # 40バイト
+if np is not None:
+    RECORD_DTYPE = np.dtype([('time', '<f8'), ('device', 'S16'),
+                             ('temp', '<f4'), ('hum', '<f4'),
+                             ('wbgt', '<f4'), ('lux', '<f4')])
+HEADER_SIZE = 256
+HEAD, TAIL = 0, 8                                   # uint64 の番号(別のキャッシュ行)
+STATS = ('received', 'accepted', 'dropped', 'duplicated', 'overflow',
+         'long_name', 'backlog')                    # backlog は受信プロセスで破棄
+RING_STATS = ('overflow', 'long_name', 'backlog')   # put() で数える統計
+STATS_INDEX = 16
+DEVICE_SIZE = 16                                    # レコードのデバイス名の長さ
+PACKET_HEAD = 4                                     # パケット長(uint32)
+NAN = float('nan')
+
+def shard_of(data, n):
+    # パケットのデバイス名から担当ワーカの番号を応答する
+    if wbgt_packet.is_binary(data):
+        device = data[4:4 + wbgt_packet.DEVICE_SIZE].rstrip(b'\x00')
+    else:
+        device = data.split(b',', 1)[0].strip()
+    return zlib.crc32(device) % n
+
+class Ring:
+    def __init__(self, capacity=ring_records, name=None):
+        if name is None:
+            size = HEADER_SIZE + capacity * RECORD_SIZE
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.capacity = capacity
+        self.buf = self.shm.buf
+        self.idx = self.buf[:HEADER_SIZE].cast('Q')
+
+    def put(self, records):
+        # Record のリストを書き込み、書き込めた件数を応答する(書き込み側)
+        idx = self.idx
+        tail = idx[TAIL]
+        free = self.capacity - (tail - idx[HEAD])
+        buf = self.buf
+        cap = self.capacity
+        n = 0
+        overflow = 0
+        long_name = 0
+        for r in records:
+            device = r.device.encode()
+            if len(device) > DEVICE_SIZE:           # 切り詰めずに破棄する
+                long_name += 1
+                continue
+            if n >= free:
+                overflow += 1
+                continue
+            struct.pack_into(RECORD_FORMAT, buf,
+                             HEADER_SIZE + (tail % cap) * RECORD_SIZE,
+                             r.time, device, r.temp, r.hum, r.wbgt,
+                             NAN if r.lux is None else r.lux)
+            tail += 1
+            n += 1
+        idx[TAIL] = tail                            # レコードを書いてから更新
+        idx[STATS_INDEX + STATS.index('overflow')] += overflow
+        idx[STATS_INDEX + STATS.index('long_name')] += long_name
+        return n
+
+    def get(self):
+        # 未読のレコード(連続した範囲)を bytes で応答する(読み出し側)
+        idx = self.idx
+        head = idx[HEAD]
+        n = idx[TAIL] - head
+        if not n:
+            return b''
+        start = head % self.capacity
+        n = min(n, self.capacity - start)           # 終端で折り返す前まで
+        off = HEADER_SIZE + start * RECORD_SIZE
+        data = bytes(self.buf[off:off + n * RECORD_SIZE])
+        idx[HEAD] = head + n                        # コピーしてから解放
+        return data
+
+    def set_stats(self, proto):
+        for i, name in enumerate(STATS):
+            if name not in RING_STATS:
+                self.idx[STATS_INDEX + i] = getattr(proto, name)
+
+    def stats(self):
+        return {name: self.idx[STATS_INDEX + i] for i, name in enumerate(STATS)}
+
+    def close(self):
+        self.idx.release()
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+class PacketRing:
+    # 受信プロセスからワーカへ受信パケット(可変長)を渡すリングバッファ
+    def __init__(self, size=packet_ring_bytes):
+        self.size = size // 4 * 4                   # 長さが折り返さないように
+        self.shm = shared_memory.SharedMemory(create=True,
+                                              size=HEADER_SIZE + self.size)
+        self.buf = self.shm.buf
+        self.idx = self.buf[:HEADER_SIZE].cast('Q')
+        self.data = self.buf[HEADER_SIZE:]
+
+    def put(self, packet):
+        # パケットを書き込み、書き込めたかを応答する(受信プロセス側)
+        idx = self.idx
+        tail = idx[TAIL]
+        n = len(packet)
+        step = (PACKET_HEAD + n + 3) & ~3
+        if step > self.size - (tail - idx[HEAD]):
+            idx[STATS_INDEX + STATS.index('backlog')] += 1
+            return False
+        data = self.data
+        size = self.size
+        pos = tail % size
+        struct.pack_into('<I', data, pos, n)
+        pos = (pos + PACKET_HEAD) % size
+        k = min(n, size - pos)                      # 終端で折り返す
+        data[pos:pos + k] = packet[:k]
+        data[:n - k] = packet[k:]
+        idx[TAIL] = tail + step                     # パケットを書いてから更新
+        return True
+
+    def get(self):
+        # 未読のパケットを bytes のリストで応答する(ワーカ側)
+        idx = self.idx
+        head = idx[HEAD]
+        tail = idx[TAIL]
+        data = self.data
+        size = self.size
+        res = []
+        while head < tail:
+            pos = head % size
+            n = struct.unpack_from('<I', data, pos)[0]
+            pos = (pos + PACKET_HEAD) % size
+            k = min(n, size - pos)
+            packet = bytes(data[pos:pos + k])
+            if k < n:
+                packet += bytes(data[:n - k])
+            res.append(packet)
+            head += (PACKET_HEAD + n + 3) & ~3
+        idx[HEAD] = head                            # コピーしてから解放
+        return res
+
+    def stats(self):
+        return {name: self.idx[STATS_INDEX + i] for i, name in enumerate(STATS)}
+
+    def close(self):
+        self.data.release()
+        self.idx.release()
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+class ShardProtocol(udp_collector.CsvUdpProtocol):
+    def __init__(self, ring, **kwargs):
+        super().__init__(ring.put, **kwargs)
+        self.ring = ring
+
+    def flush(self):
+        super().flush()
+        self.ring.set_stats(self)
+
+def open_socket(port=udp_port, host='0.0.0.0', reuseport=True):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuseport:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+def _worker(ring, sock, kwargs):
+    # SO_REUSEPORT のソケットから受信して解析する
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # Ctrl-C は親プロセスで処理
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(
+            lambda: ShardProtocol(ring, **kwargs), sock=sock)
+        await asyncio.Future()                      # 終了まで待機
+
+    asyncio.run(serve())
+
+def _parse_worker(ring, packets, wake, kwargs):
+    # 受信プロセスから渡されたパケットを解析する
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        proto = ShardProtocol(ring, **kwargs)
+        proto._schedule()                           # 一括解析のタイマ
+
+        def on_wake():
+            try:
+                os.read(wake, 4096)                 # 通知を読み捨てる
+            except BlockingIOError:
+                pass
+            for data in packets.get():              # 通知後の書き込みも読む
+                proto.datagram_received(data, None)
+
+        loop.add_reader(wake, on_wake)
+        await asyncio.Future()
+
+    asyncio.run(serve())
+
+def _reader(sock, packets, wakes, batch=udp_collector.batch_size):
+    # 全パケットを1回だけ受信し、担当ワーカのパケット用リングバッファへ渡す
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                        udp_collector.rcvbuf)
+    except OSError:
+        pass
+    sock.setblocking(False)
+    n = len(packets)
+    buf = bytearray(65536)                          # UDPの最大長
+    view = memoryview(buf)
+    while True:
+        select.select([sock], [], [])
+        touched = set()
+        for i in range(batch):
+            try:
+                size = sock.recv_into(buf)
+            except BlockingIOError:
+                break
+            data = bytes(view[:size])
+            k = shard_of(data, n)
+            if packets[k].put(data):
+                touched.add(k)
+        for k in touched:                           # まとめて1回だけ通知する
+            try:
+                os.write(wakes[k], b'\x00')
+            except BlockingIOError:                 # 未読の通知が残っている
+                pass
+
+class ShardedCollector:
+    def __init__(self, n_workers=n_workers, port=udp_port, host='0.0.0.0',
+                 broadcast=broadcast, capacity=ring_records, **kwargs):
+        self.n = n_workers or os.cpu_count() or 1
+        self.port = port
+        self.host = host
+        self.broadcast = broadcast
+        self.dispatch = broadcast and self.n > 1    # 受信プロセスを使用する
+        self.capacity = capacity
+        self.kwargs = kwargs                        # CsvUdpProtocol の引数
+        self.rings = []
+        self.packets = []                           # パケット用リングバッファ
+        self.procs = []
+
+    def start(self):
+        # 共有メモリは fork で子プロセスへ引き継ぐ(名前で開き直さない)
+        ctx = multiprocessing.get_context('fork')
+        self.rings = [Ring(self.capacity) for k in range(self.n)]
+        if self.dispatch:
+            sock = open_socket(self.port, self.host, reuseport=False)
+            self.port = sock.getsockname()[1]
+            self.packets = [PacketRing() for k in range(self.n)]
+            pipes = [os.pipe() for k in range(self.n)]
+            for r, w in pipes:
+                os.set_blocking(r, False)
+                os.set_blocking(w, False)
+            for k in range(self.n):
+                self._fork(ctx, _parse_worker, self.rings[k], self.packets[k],
+                           pipes[k][0], self.kwargs)
+            self._fork(ctx, _reader, sock, self.packets,
+                       [w for r, w in pipes])
+            sock.close()
+            for fds in pipes:
+                for fd in fds:
+                    os.close(fd)                    # 子プロセスが使用する
+            return self
+        socks = []
+        for k in range(self.n):
+            sock = open_socket(self.port, self.host)
+            if k == 0 and self.port == 0:           # 空きポートを全ワーカで共有
+                self.port = sock.getsockname()[1]
+            socks.append(sock)
+        for k in range(self.n):
+            self._fork(ctx, _worker, self.rings[k], socks[k], self.kwargs)
+        for sock in socks:
+            sock.close()                            # 子プロセスが使用する
+        return self
+
+    def _fork(self, ctx, target, *args):
+        p = ctx.Process(target=target, args=args, daemon=True)
+        p.start()
+        self.procs.append(p)
+
+    def poll(self):
+        # 全リングバッファの未読レコードを bytes のリストで応答する
+        res = []
+        for ring in self.rings:
+            data = ring.get()
+            while data:
+                res.append(data)
+                data = ring.get()
+        return res
+
+    def columns(self, chunks=None):
+        # 未読レコードを列毎の配列で応答する (NumPy が必要)
+        if chunks is None:
+            chunks = self.poll()
+        data = b''.join(chunks)
+        return np.frombuffer(data, dtype=RECORD_DTYPE)
+
+    def records(self, chunks=None):
+        # 未読レコードを udp_collector.Record のリストで応答する
+        if chunks is None:
+            chunks = self.poll()
+        res = []
+        for data in chunks:
+            for t, dev, temp, hum, w, lux in struct.iter_unpack(RECORD_FORMAT,
+                                                                data):
+                res.append(udp_collector.Record(
+                    t, dev.rstrip(b'\x00').decode(), temp, hum, w,
+                    None if lux != lux else lux))
+        return res
+
+    def stats(self):
+        total = dict.fromkeys(STATS, 0)
+        for ring in self.rings + self.packets:
+            for k, v in ring.stats().items():
+                total[k] += v
+        return total
+
+    def stop(self):
+        for p in self.procs:
+            p.terminate()
+        for p in self.procs:
+            p.join()
+        for ring in self.rings + self.packets:
+            ring.close()
+            ring.unlink()
+        self.procs = []
+        self.rings = []
+        self.packets = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+if __name__ == "__main__":
+    import sys
+    from time import monotonic, sleep
+    if len(sys.argv) > 1:
+        n_workers = int(sys.argv[1])
+    with ShardedCollector(n_workers) as col:
+        print('Listening UDP port', udp_port, 'workers =', col.n)
+        n = 0
+        t_prev = monotonic()
+        try:
+            while True:
+                sleep(1)
+                chunks = col.poll()
+                k = sum(len(c) for c in chunks) // RECORD_SIZE
+                n += k
+                t = monotonic()
+                print('records = %d (%.0f/s)' % (n, k / (t - t_prev)),
+                      col.stats())
+                t_prev = t
+        except KeyboardInterrupt:
+            print()
@@ -9,40 +9,53 @@
 
 sht31 = 0x44                                        # sht31 = 0x44 又は 0x45
 
+sht31_mps = 0                                       # 0:単発, 0.5〜10:定期測定(回/秒)
 wbgt_ver = 3                                        # WBGTバージョン 3または4
 wbgt_wide = True                                    # 筆者の独自拡張Wide版
+coef_file = ''                                      # 係数表(wbgt_fit.pyで作成)
+wbgt_stats = False                                  # 1時間平均と10分間最大を表示
+archive_dir = ''                                    # 保存先フォルダ(空は保存なし)
 
 import smbus
+import sht31 as sht31_decoder                       # SHT31の測定・変換処理
+from wbgt_calc import wbgt_coef                     # WBGT係数表を組み込む
+from wbgt_calc import load_coef                     # 係数表(JSON)の読み込み
 from time import sleep                              # 時間取得を組み込む
-
-def word2uint(d1,d2):
-    i = d1
-    i <<= 8
-    i += d2
-    return i
+from time import monotonic                          # 移動窓統計の時刻に使用
+from wbgt_rolling import WBGTAggregator             # WBGTの移動窓統計
+from time import time                               # 保存時の時刻に使用
+from wbgt_archive import ArchiveWriter              # 列指向アーカイブ
 
 i2c = smbus.SMBus(1)
+if coef_file:
+    load_coef(coef_file)                            # wbgt_ver に名前を指定する
+a, b, c, d = wbgt_coef(wbgt_ver, wbgt_wide)         # WBGT係数を取得
 temp = 0.                                           # 温度値を保持する変数
 hum  = 0.                                           # 湿度値を保持する変数
 wbgt = 0.                                           # WGBTを保持する変数
+agg = WBGTAggregator() if wbgt_stats else None      # 移動窓統計
+archive = ArchiveWriter(archive_dir) if archive_dir else None   # 保存用
+if sht31_mps:
+    sht31_decoder.start_periodic(i2c, sht31, sht31_mps) # 定期測定を開始
 
 while i2c:
-    i2c.write_byte_data(sht31,0x24,0x00)
-    sleep(0.018)
-    data = i2c.read_i2c_block_data(sht31,0x00,6)
-    if len(data) >= 5:
-        temp = float(word2uint(data[0],data[1])) / 65535. * 175. - 45.
-        hum  = float(word2uint(data[3],data[4])) / 65535. * 100.
-        if wbgt_ver == 3 and wbgt_wide == False:
-            wbgt = 0.687 * temp + 0.0360 * hum + 0.00367 * temp * hum - 2.062
-        elif wbgt_ver == 3 and wbgt_wide == True:
-            wbgt = 0.725 * temp + 0.0368 * hum + 0.00364 * temp * hum - 3.246
-        elif wbgt_ver == 4 and wbgt_wide == False:
-            wbgt = 0.724 * temp + 0.0342 * hum + 0.00277 * temp * hum - 3.007
-        elif wbgt_ver == 4 and wbgt_wide == True:
-            wbgt = 0.754 * temp + 0.0382 * hum + 0.00264 * temp * hum - 3.965
+    if sht31_mps:
+        res = sht31_decoder.fetch(i2c, sht31)       # 最新の測定値(待ち時間無し)
+    else:
+        res = sht31_decoder.read_single(i2c, sht31) # 単発測定(約18msの待ち)
+    if res:                                         # 新しい値が無い時は None
+        temp, hum = res
+        wbgt = a * temp + b * hum + c * temp * hum + d
         print("Temp. = %.2f ℃, Humid. = %.0f ％" % (temp,hum),end='')
-        print(", WBGT = %.2f ℃" % wbgt)
+        print(", WBGT = %.2f ℃" % wbgt, end='')
+        if agg:
+            agg.update(sht31, monotonic(), wbgt)
+            st = agg.stats(sht31)
+            print(", WBGT_1h = %.2f ℃" % st['mean_1h'], end='')
+            print(", WBGT_max10m = %.2f ℃" % st['max_10m'], end='')
+        print()
+        if archive:
+            archive.append(time(), 'sht31_%02x' % sht31, temp, hum, wbgt=wbgt)
     sleep(1)
 
 ''' ----------------------------------------------------------------------------
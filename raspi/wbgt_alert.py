@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# 暑さ指数(WBGT)の段階判定と警報 (多数のデバイス用)
+#
+# 段階：0 ほぼ安全, 1 注意(21以上), 2 警戒(25以上), 3 厳重警戒(28以上),
+#       4 危険(31以上)
+#
+# ・ヒステリシス  段階を下げるのは、下の閾値より hysteresis ℃ 以上低い時
+# ・最短継続時間  新しい段階が min_duration 秒以上続いた時に確定します
+#                 (デバイスの最初の値は直ぐに確定します)
+#
+# デバイス毎の状態(確定した段階, 候補の段階, 候補になった時刻, 最新値)を
+# 配列で保持します。update() は全デバイスの新しい値の段階を一括で求め、
+# 段階が変化したデバイス(又は候補のあるデバイス)だけを個別に処理します。
+# NumPy があれば 10万台分を数ms で処理します(無い時は1件ずつ処理します)。
+#
+# 段階が確定する度に Event を sinks(関数のリスト)へ送ります。
+#   print_events      Event を表示します
+#   JsonLinesSink     Event を1行1件の JSON でファイルに保存します
+#   QueueSink         Event を queue.Queue に入れます(別スレッドで処理する時)
+#
+# 使用例：
+#   alert = AlertEngine(sinks=[print_events])
+#   idx = alert.index(['humid_1', 'humid_2'])     # デバイス番号(初回に登録)
+#   alert.update(idx, time(), [27.5, 29.1])
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import json
+import queue
+from bisect import bisect_right
+from collections import namedtuple
+
+try:
+    import numpy as np                              # NumPy(あれば使用する)
+except ImportError:
+    np = None
+
+BANDS = (21., 25., 28., 31.)                        # 注意, 警戒, 厳重警戒, 危険
+LEVEL_NAMES = ('ほぼ安全', '注意', '警戒', '厳重警戒', '危険')
+UNKNOWN = -1                                        # 最初の値を受け取る前
+
+# level, prev は段階(prev は最初の値の時 UNKNOWN)
+Event = namedtuple('Event', ('time', 'device', 'level', 'prev', 'wbgt'))
+
+class AlertEngine:
+    def __init__(self, bands=BANDS, hysteresis=0.5, min_duration=60.,
+                 sinks=(), capacity=1024):
+        self.bands = tuple(sorted(bands))
+        self.hysteresis = hysteresis                # 段階を下げる時の幅(℃)
+        self.min_duration = min_duration            # 最短継続時間(秒)
+        self.sinks = list(sinks)
+        self.names = []                             # デバイス番号 → 名前
+        self.devices = {}                           # 名前 → デバイス番号
+        self._down = tuple(b - hysteresis for b in self.bands)
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        # 状態の配列を capacity 台分に拡張する
+        def grow(name, dtype, fill):
+            old = getattr(self, name, None)
+            if np is None:
+                return (old or []) + [fill] * (capacity - len(old or ()))
+            new = np.full(capacity, fill, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+        self.level = grow('level', 'i1', UNKNOWN)   # 確定した段階
+        self.pending = grow('pending', 'i1', UNKNOWN)   # 候補の段階
+        self.since = grow('since', 'f8', 0.)        # 候補になった時刻
+        self.wbgt = grow('wbgt', 'f4', float('nan'))    # 最新値
+        if np is not None:
+            self._slot = np.zeros(capacity, dtype=np.intp)  # 重複確認用
+        self.capacity = capacity
+
+    def index(self, names):
+        # デバイス名のリストをデバイス番号に変換する(新しい名前は登録する)
+        res = []
+        devices = self.devices
+        for name in names:
+            i = devices.get(name)
+            if i is None:
+                i = devices[name] = len(self.names)
+                self.names.append(name)
+            res.append(i)
+        if len(self.names) > self.capacity:
+            cap = self.capacity
+            while cap < len(self.names):
+                cap *= 2
+            self._alloc(cap)
+        return res
+
+    def classify(self, wbgt):
+        # ヒステリシス無しの段階 (0〜4)
+        return bisect_right(self.bands, wbgt)
+
+    def update(self, idx, t, wbgt):
+        # idx: デバイス番号の配列, t: 時刻(配列又は値), wbgt: WBGT値の配列
+        # 確定した Event のリストを応答し、sinks にも送る
+        if np is not None:
+            events = self._update_numpy(idx, t, wbgt)
+        else:
+            events = self._update_python(idx, t, wbgt)
+        if events:
+            for sink in self.sinks:
+                sink(events)
+        return events
+
+    def _update_numpy(self, idx, t, wbgt):
+        idx = np.asarray(idx, dtype=np.intp)
+        w = np.asarray(wbgt, dtype=np.float64)
+        t = np.broadcast_to(np.asarray(t, dtype=np.float64), w.shape)
+        ok = w == w                                 # NaN を除く
+        if not ok.all():
+            idx, w, t = idx[ok], w[ok], t[ok]
+        n = len(idx)
+        pos = np.arange(n)
+        self._slot[idx] = pos                       # 同じデバイスは最後の位置
+        if (self._slot[idx] == pos).all():          # 重複なし(通常)
+            return self._evaluate(idx, t, w)[1]
+        # 同じデバイスが複数ある時は、到着順に1件ずつの組に分けて処理する
+        order = np.argsort(idx, kind='stable')
+        s = idx[order]
+        first = np.concatenate(([True], s[1:] != s[:-1]))
+        start = np.maximum.accumulate(np.where(first, pos, 0))
+        rank = np.empty(n, dtype=np.intp)
+        rank[order] = pos - start                   # 同じデバイス内の順番
+        fired = []
+        events = []
+        for r in range(int(rank.max()) + 1):
+            m = np.flatnonzero(rank == r)
+            f, ev = self._evaluate(idx[m], t[m], w[m])
+            fired.append(m[f])
+            events += ev
+        return [events[i] for i in np.argsort(np.concatenate(fired))]  # 到着順
+
+    def _evaluate(self, idx, t, w):
+        # idx に重複が無いこと。(確定した行の位置, Event のリスト) を応答する
+        cur = self.level[idx]
+        self.wbgt[idx] = w
+        up = np.searchsorted(self.bands, w, 'right')
+        down = np.searchsorted(self._down, w, 'right')
+        target = np.where(up > cur, up, np.minimum(cur, down))
+        act = np.flatnonzero((target != cur) | (self.pending[idx] != cur))
+        if not act.size:                            # 変化したデバイスのみ処理
+            return act, []
+        i = idx[act]
+        tg = target[act].astype(np.int8)
+        cu = cur[act]
+        ta = t[act]
+        new = tg != self.pending[i]                 # 候補が変わった
+        self.pending[i[new]] = tg[new]
+        self.since[i[new]] = ta[new]
+        fire = (tg != cu) & ((cu == UNKNOWN) |
+                             (ta - self.since[i] >= self.min_duration))
+        f = i[fire]
+        self.level[f] = tg[fire]
+        names = self.names
+        return act[fire], [
+            Event(float(tt), names[k], int(lv), int(pv), float(wv))
+            for tt, k, lv, pv, wv in zip(ta[fire], f, tg[fire], cu[fire],
+                                         w[act][fire])]
+
+    def _update_python(self, idx, t, wbgt):
+        events = []
+        ts = t if hasattr(t, '__len__') else [t] * len(idx)
+        level, pending, since = self.level, self.pending, self.since
+        for k, tt, w in zip(idx, ts, wbgt):
+            if w != w:                              # NaN
+                continue
+            self.wbgt[k] = w
+            cur = level[k]
+            tg = bisect_right(self.bands, w)
+            if tg <= cur:
+                tg = min(cur, bisect_right(self._down, w))
+            if tg == cur and pending[k] == cur:     # 変化なし
+                continue
+            if tg != pending[k]:
+                pending[k] = tg
+                since[k] = tt
+            if tg != cur and (cur == UNKNOWN or tt - since[k] >= self.min_duration):
+                level[k] = tg
+                events.append(Event(tt, self.names[k], tg, cur, w))
+        return events
+
+    def update_records(self, records):
+        # udp_collector.Record のリストで更新する
+        idx = self.index([r.device for r in records])
+        return self.update(idx, [r.time for r in records],
+                           [r.wbgt for r in records])
+
+    def levels(self):
+        # {デバイス名: 確定した段階}
+        return {name: int(self.level[i]) for i, name in enumerate(self.names)}
+
+def print_events(events):
+    for e in events:
+        prev = LEVEL_NAMES[e.prev] if e.prev != UNKNOWN else '-'
+        print("%s: WBGT = %.1f ℃, %s → %s" % (e.device, e.wbgt, prev,
+                                               LEVEL_NAMES[e.level]))
+
+class JsonLinesSink:
+    def __init__(self, filename):
+        self.file = open(filename, 'a')
+
+    def __call__(self, events):
+        for e in events:
+            self.file.write(json.dumps(e._asdict(), ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class QueueSink:
+    def __init__(self, maxsize=10000):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0                            # 満杯で破棄した数
+
+    def __call__(self, events):
+        for e in events:
+            try:
+                self.queue.put_nowait(e)
+            except queue.Full:
+                self.dropped += 1
+
+if __name__ == "__main__":
+    from time import perf_counter
+    alert = AlertEngine(min_duration=60., sinks=[print_events])
+    idx = alert.index(['humid_1'])
+    for i, w in enumerate((24., 25.2, 25.4, 24.8, 25.3, 25.5, 26., 24.7, 24.4)):
+        alert.update(idx, i * 30., [w])             # 30秒毎
+    if np is not None:
+        n = 100000
+        alert = AlertEngine(min_duration=60.)
+        idx = np.array(alert.index(['humid_%d' % i for i in range(n)]))
+        rng = np.random.default_rng(0)
+        w = rng.uniform(18., 34., n)
+        alert.update(idx, 0., w)
+        dt = []
+        events = 0
+        for k in range(1, 101):
+            w += rng.normal(0., 0.05, n)            # 10秒毎に少しずつ変化
+            t0 = perf_counter()
+            events += len(alert.update(idx, k * 10., w))
+            dt.append(perf_counter() - t0)
+        dt.sort()
+        print("%d devices: median %.2f ms, max %.2f ms per update, %d events"
+              % (n, dt[50] * 1000., dt[-1] * 1000., events))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# WBGT 時系列データの列指向アーカイブ (メモリマップド・ファイル)
+#
+# 測定結果を追記専用のセグメント・ファイル(seg_000000.wbc, ...)に保存します。
+# 各セグメントは capacity 行分を予め確保し、列毎に固定長で並べます。
+#
+#   ヘッダ(4096バイト)
+#     識別子 'WBGTARC1'(8) 行数上限(4) 行数(4) 先頭時刻(8) 最終時刻(8)
+#     疎索引: INDEX_STEP 行毎の時刻 (float64)
+#   列: time float64, device uint32, temp, hum, lux, wbgt, wbgt_lum float32
+#
+# ・ArchiveWriter  raspi/ のスクリプトから1行ずつ追記します(NumPy不要)。
+#                  mmap で書き込むため追記の負荷が小さく、flush_rows 行毎に
+#                  まとめてSDカードへ書き出します。時計が戻った時(NTPの補正
+#                  等)は前の行の時刻で記録し、clamped に回数を数えます。
+# ・ArchiveReader  numpy.memmap で列をコピーせずに参照し、時刻範囲で切り出し
+#                  ます。セグメントの先頭・最終時刻と疎索引で範囲を絞ります。
+#
+# デバイス識別名は devices.txt に1行1件で保存し、行番号を device 列に格納します。
+# 測定値が無い列(照度センサ無し等)は NaN です。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import mmap
+import os
+import struct
+
+MAGIC = b'WBGTARC1'                                 # ファイル識別子
+HEADER_SIZE = 4096                                  # ヘッダ長
+HEADER_FORMAT = '<8sIIdd'                           # 識別子,上限,行数,先頭,最終
+INDEX_OFFSET = 64                                   # 疎索引の位置
+INDEX_STEP = 1024                                   # 疎索引の間隔(行)
+CAPACITY = 65536                                    # セグメント毎の行数
+COLUMNS = (                                         # 列名と型
+    ('time', 'd'), ('device', 'I'), ('temp', 'f'), ('hum', 'f'),
+    ('lux', 'f'), ('wbgt', 'f'), ('wbgt_lum', 'f'),
+)
+NAN = float('nan')
+
+def _layout(capacity):
+    # 列毎の (名前, 型, オフセット) を応答する
+    if (capacity // INDEX_STEP) * 8 > HEADER_SIZE - INDEX_OFFSET:
+        raise ValueError("capacity が大きすぎます")
+    cols = []
+    offset = HEADER_SIZE
+    for name, code in COLUMNS:
+        cols.append((name, code, offset))
+        offset += struct.calcsize(code) * capacity
+        offset = (offset + 4095) // 4096 * 4096     # ページ境界に揃える
+    return cols, offset
+
+def _segment_name(n):
+    return 'seg_%06d.wbc' % n
+
+class ArchiveWriter:
+    def __init__(self, path, capacity=CAPACITY, flush_rows=64):
+        self.path = path
+        self.capacity = capacity
+        self.flush_rows = flush_rows                # まとめて書き出す行数
+        os.makedirs(path, exist_ok=True)
+        self.devices = {}
+        dev_file = os.path.join(path, 'devices.txt')
+        if os.path.exists(dev_file):
+            with open(dev_file) as f:
+                for i, name in enumerate(f.read().splitlines()):
+                    self.devices[name] = i
+        self._dev_file = open(dev_file, 'a')
+        segs = sorted(s for s in os.listdir(path) if s.endswith('.wbc'))
+        self._seg_no = int(segs[-1][4:10]) if segs else 0
+        self._mm = None
+        self._open_segment(self._seg_no)
+        self._t_prev = self._t_last                 # セグメントを跨いで保持
+        self.clamped = 0                            # 時計が戻った回数
+        if self._count >= self._capacity:
+            self._next_segment()
+
+    def _open_segment(self, n):
+        if self._mm:
+            self._mm.flush()
+            self._mm.close()
+            self._f.close()
+        name = os.path.join(self.path, _segment_name(n))
+        if os.path.exists(name):
+            self._f = open(name, 'r+b')
+            head = self._f.read(struct.calcsize(HEADER_FORMAT))
+            magic, cap, count, t_first, t_last = struct.unpack(HEADER_FORMAT,
+                                                               head)
+            if magic != MAGIC:
+                raise ValueError("アーカイブではありません: " + name)
+        else:
+            cap, count, t_first, t_last = self.capacity, 0, NAN, NAN
+            self._f = open(name, 'w+b')
+            size = _layout(cap)[1]
+            self._f.truncate(size)                  # 予め確保(疎なファイル)
+            self._f.write(struct.pack(HEADER_FORMAT, MAGIC, cap, 0, NAN, NAN))
+            self._f.flush()
+        self._mm = mmap.mmap(self._f.fileno(), 0)
+        self._seg_no = n
+        self._capacity = cap
+        self._count = count
+        self._t_first = t_first
+        self._t_last = t_last
+        self._cols = [(code, off, struct.calcsize(code))
+                      for name, code, off in _layout(cap)[0]]
+        self._dirty = 0
+
+    def _next_segment(self):
+        self._open_segment(self._seg_no + 1)
+
+    def device_id(self, device):
+        i = self.devices.get(device)
+        if i is None:
+            i = self.devices[device] = len(self.devices)
+            self._dev_file.write(device + '\n')
+            self._dev_file.flush()
+        return i
+
+    def append(self, t, device, temp=NAN, hum=NAN, lux=NAN, wbgt=NAN,
+               wbgt_lum=NAN):
+        if t < self._t_prev:                        # NaN との比較は常に False
+            t = self._t_prev                        # 時刻順を保つ
+            self.clamped += 1
+        if self._count >= self._capacity:
+            self._next_segment()
+        row = self._count
+        values = (t, self.device_id(device), temp, hum, lux, wbgt, wbgt_lum)
+        mm = self._mm
+        for (code, off, size), v in zip(self._cols, values):
+            struct.pack_into('<' + code, mm, off + row * size, v)
+        if row % INDEX_STEP == 0:                   # 疎索引
+            struct.pack_into('<d', mm, INDEX_OFFSET + row // INDEX_STEP * 8, t)
+        if row == 0:
+            self._t_first = t
+        self._t_last = t
+        self._t_prev = t
+        self._count = row + 1
+        # 行を書き終えてから行数を更新する
+        struct.pack_into(HEADER_FORMAT, mm, 0, MAGIC, self._capacity,
+                         self._count, self._t_first, self._t_last)
+        self._dirty += 1
+        if self._dirty >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if self._mm and self._dirty:
+            self._mm.flush()
+            self._dirty = 0
+
+    def close(self):
+        if self._mm:
+            self.flush()
+            self._mm.close()
+            self._f.close()
+            self._mm = None
+        self._dev_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class ArchiveReader:
+    def __init__(self, path):
+        import numpy as np                          # 読み出しは NumPy が必要
+        self.np = np
+        self.path = path
+        self.refresh()
+
+    def refresh(self):
+        # セグメントのヘッダと devices.txt を読み直す
+        self.devices = []
+        dev_file = os.path.join(self.path, 'devices.txt')
+        if os.path.exists(dev_file):
+            with open(dev_file) as f:
+                self.devices = f.read().splitlines()
+        self.segments = []                          # (名前, 上限, 行数, 先頭, 最終)
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith('.wbc'):
+                continue
+            full = os.path.join(self.path, name)
+            with open(full, 'rb') as f:
+                head = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, cap, count, t_first, t_last = struct.unpack(HEADER_FORMAT,
+                                                               head)
+            if magic == MAGIC and count:
+                self.segments.append((full, cap, count, t_first, t_last))
+
+    def columns(self, segment):
+        # セグメントの全列を numpy.memmap で参照する(コピー無し)
+        np = self.np
+        full, cap, count = segment[:3]
+        res = {}
+        for name, code, off in _layout(cap)[0]:
+            res[name] = np.memmap(full, dtype='<' + code, mode='r',
+                                  offset=off, shape=(count,))
+        return res
+
+    def _range(self, segment, t0, t1):
+        # 疎索引で範囲を絞り込んでから、time 列を二分探索する
+        np = self.np
+        full, cap, count = segment[:3]
+        n_idx = (count + INDEX_STEP - 1) // INDEX_STEP
+        idx = np.memmap(full, dtype='<d', mode='r', offset=INDEX_OFFSET,
+                        shape=(n_idx,))
+        lo = max(int(np.searchsorted(idx, t0, 'left')) - 1, 0) * INDEX_STEP
+        hi = min(int(np.searchsorted(idx, t1, 'left')) * INDEX_STEP, count)
+        off = _layout(cap)[0][0][2]
+        ts = np.memmap(full, dtype='<d', mode='r', offset=off + lo * 8,
+                       shape=(hi - lo,))
+        return (lo + int(np.searchsorted(ts, t0, 'left')),
+                lo + int(np.searchsorted(ts, t1, 'left')))
+
+    def read(self, t0=float('-inf'), t1=float('inf')):
+        # t0 <= time < t1 の行を列毎の配列で応答する
+        np = self.np
+        parts = []
+        for seg in self.segments:
+            if seg[4] < t0 or seg[3] >= t1:         # 範囲外のセグメント
+                continue
+            i, j = self._range(seg, t0, t1)
+            if i < j:
+                parts.append({k: v[i:j] for k, v in self.columns(seg).items()})
+        if len(parts) == 1:
+            return parts[0]                         # コピー無しで参照
+        if not parts:
+            return {name: np.empty(0, dtype='<' + code)
+                    for name, code in COLUMNS}
+        return {name: np.concatenate([p[name] for p in parts])
+                for name, code in COLUMNS}
+
+    def device_name(self, device_id):
+        return self.devices[device_id]
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from time import perf_counter
+    path = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    n = 200000
+    t0 = perf_counter()
+    with ArchiveWriter(path, capacity=65536, flush_rows=4096) as w:
+        for i in range(n):
+            w.append(1.7e9 + i, 'humid_%d' % (i % 8), 25., 60., NAN, 24., NAN)
+    dt = perf_counter() - t0
+    print("append %d rows : %.3f s (%.0f rows/s)" % (n, dt, n / dt))
+    r = ArchiveReader(path)
+    t0 = perf_counter()
+    cols = r.read(1.7e9 + 70000, 1.7e9 + 70100)
+    dt = perf_counter() - t0
+    print("read %d rows : %.6f s" % (len(cols['time']), dt), path)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# 温度と湿度から WBGT を計算する共通モジュール
+#
+# WBGT = a * Ta + b * RH + c * Ta * RH + d
+#
+# ・係数は WBGT_COEF の表で管理します (WBGTバージョン 3/4, Wide版の有無)
+# ・load_coef()  wbgt_fit.py で作成した係数表(JSON)を WBGT_COEF に追加します
+# ・wbgt()       1件の温度・湿度から WBGT を計算します
+# ・wbgt_batch() 温度・湿度の配列(NumPy配列, array.array, bytes等のバッファ)から
+#                WBGT を一括で計算します。NumPy が無い環境では Python のみで
+#                計算し、同じ演算順序のため NumPy 版と同一の結果になります。
+# ・SolarLoad    照度による WBGT の上昇分(wbgt_lum.py の WBGT_lum)を計算します。
+#                定数は生成時に1つの係数にまとめ、照度と WBGT の配列を一括で
+#                処理します。照射面積や吸収率は地点毎の配列でも指定できます。
+#
+# 使用例：
+#   from wbgt_calc import wbgt, wbgt_batch
+#   w = wbgt(28., 90., 3, True)                     # 29.5388
+#   ws = wbgt_batch(ta_array, rh_array, 4, False)   # 配列で一括計算
+#   wl = SolarLoad().apply(lux_array, ws)           # WBGT_lum を一括計算
+#
+# WBGTバージョンの違い、筆者の独自拡張(Wide版)については下記を参照ください。
+# https://bokunimo.net/blog/raspberry-pi/4777/
+# 照度の影響については下記を参照ください。
+# https://bokunimo.net/blog/raspberry-pi/5036/
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+from array import array                             # Python のみで計算する時の配列
+
+try:
+    import numpy as np                              # NumPy(あれば使用する)
+except ImportError:
+    np = None
+
+# WBGT 係数表 (a, b, c, d)  キー：(WBGTバージョン, Wide版)
+WBGT_COEF = {
+    (3, False): (0.687, 0.0360, 0.00367, -2.062),   # 日本生気象学会の表 Ver.3
+    (3, True):  (0.725, 0.0368, 0.00364, -3.246),   # 筆者の独自拡張Wide版
+    (4, False): (0.724, 0.0342, 0.00277, -3.007),   # 日本生気象学会の表 Ver.4
+    (4, True):  (0.754, 0.0382, 0.00264, -3.965),   # 筆者の独自拡張Wide版
+}
+
+WBGT_TERMS = ('Ta', 'RH', 'Ta*RH', '1')             # 係数 a, b, c, d の項
+
+def load_coef(filename):
+    # 係数表(JSON)を WBGT_COEF に追加し、追加したキーのリストを応答する
+    import json
+    with open(filename, encoding='utf-8') as f:
+        table = json.load(f)
+    if tuple(table.get('terms', WBGT_TERMS)) != WBGT_TERMS:
+        raise ValueError("ERROR:係数表の項が不正 (%s)" % table['terms'])
+    keys = []
+    for entry in table['coef']:
+        coef = tuple(float(v) for v in entry['values'])
+        if len(coef) != len(WBGT_TERMS):
+            raise ValueError("ERROR:係数の数が不正 (%s)" % entry['ver'])
+        key = (entry['ver'], bool(entry.get('wide', False)))
+        WBGT_COEF[key] = coef
+        keys.append(key)
+    return keys
+
+def wbgt_coef(wbgt_ver=3, wbgt_wide=True):
+    try:
+        return WBGT_COEF[(wbgt_ver, bool(wbgt_wide))]
+    except KeyError:
+        raise ValueError("ERROR:WBGTバージョンが不正 (%s)" % wbgt_ver)
+
+def wbgt(temp, hum, wbgt_ver=3, wbgt_wide=True):
+    a, b, c, d = wbgt_coef(wbgt_ver, wbgt_wide)
+    return a * temp + b * hum + c * temp * hum + d
+
+def _as_float64(data):
+    if isinstance(data, (bytes, bytearray)):
+        return np.frombuffer(data, dtype=np.float64) # float64 のバッファとして扱う
+    return np.asarray(data, dtype=np.float64)       # 配列, memoryview, list 等
+
+_BLOCK = 16384                                      # 一括計算の分割単位(キャッシュ内に収める)
+
+def _wbgt_batch_numpy(temp, hum, coef, out):
+    a, b, c, d = coef
+    t = _as_float64(temp)
+    h = _as_float64(hum)
+    if t.shape != h.shape:
+        raise ValueError("temp と hum の要素数が異なります")
+    if out is None:
+        out = np.empty(t.shape, dtype=np.float64)
+    if np.shares_memory(out, t):                    # out=temp の時は先に複製する
+        t = t.copy()
+    if np.shares_memory(out, h):                    # out=hum の時も同様
+        h = h.copy()
+    t = t.reshape(-1)
+    h = h.reshape(-1)
+    o = out.reshape(-1)                             # out と同じメモリを参照する
+    n = t.shape[0]
+    tmp = np.empty(min(n, _BLOCK), dtype=np.float64)
+    # wbgt() と同じ演算順序 ((a*t + b*h) + (c*t)*h) + d で一時配列を再利用する
+    for i in range(0, n, _BLOCK):
+        j = min(i + _BLOCK, n)
+        ti = t[i:j]
+        hi = h[i:j]
+        oi = o[i:j]
+        ki = tmp[:j - i]
+        np.multiply(ti, a, out=oi)
+        np.multiply(hi, b, out=ki)
+        oi += ki
+        np.multiply(ti, c, out=ki)
+        ki *= hi
+        oi += ki
+        oi += d
+    return out
+
+def _wbgt_batch_python(temp, hum, coef):
+    a, b, c, d = coef
+    if isinstance(temp, (bytes, bytearray)):
+        temp = memoryview(temp).cast('d')
+    if isinstance(hum, (bytes, bytearray)):
+        hum = memoryview(hum).cast('d')
+    if len(temp) != len(hum):
+        raise ValueError("temp と hum の要素数が異なります")
+    return array('d', [a * t + b * h + c * t * h + d for t, h in zip(temp, hum)])
+
+def wbgt_batch(temp, hum, wbgt_ver=3, wbgt_wide=True, coef=None, out=None):
+    # coef を指定した場合は係数表の代わりに (a, b, c, d) を使用する
+    if coef is None:
+        coef = wbgt_coef(wbgt_ver, wbgt_wide)
+    if np is not None:
+        return _wbgt_batch_numpy(temp, hum, coef, out)  # NumPy配列を応答
+    return _wbgt_batch_python(temp, hum, coef)      # array('d') を応答
+
+math_pi = 3.1415927                                 # 円周率
+PHANTOM_S = (0.58 / (2*math_pi))**2 * math_pi       # 照射面積(m2)
+
+class SolarLoad:
+    # WBGT_lum = WBGT + absorb * lux2w * lux * area * 1.5 * 3600 / 5
+    #                   / (4184 * (0.37 + 0.63 * 0.55))
+    def __init__(self, area=PHANTOM_S, absorb=0.8, lux2w=6e-3):
+        # area, absorb は地点毎の配列でも良い(照度の配列と同じ要素数)
+        if np is not None and (np.ndim(area) or np.ndim(absorb)):
+            area = np.asarray(area, dtype=np.float64)
+            absorb = np.asarray(absorb, dtype=np.float64)
+        elif np is None and (hasattr(area, '__len__') or
+                             hasattr(absorb, '__len__')):
+            n = len(area) if hasattr(area, '__len__') else len(absorb)
+            area = area if hasattr(area, '__len__') else [area] * n
+            absorb = absorb if hasattr(absorb, '__len__') else [absorb] * n
+            self.k = array('d', [self._coef(s, a, lux2w)
+                                 for s, a in zip(area, absorb)])
+            return
+        self.k = self._coef(area, absorb, lux2w)    # 照度1lxあたりの上昇分(℃)
+
+    @staticmethod
+    def _coef(area, absorb, lux2w):
+        return (absorb * lux2w * area * 1.5 * 3600 / 5
+                / (4184 * (0.37 + 0.63 * 0.55)))
+
+    def delta(self, lux):
+        if np is not None:
+            return self.k * _as_float64(lux)
+        if isinstance(self.k, array):
+            return array('d', [k * x for k, x in zip(self.k, lux)])
+        k = self.k
+        if hasattr(lux, '__len__'):
+            return array('d', [k * x for x in lux])
+        return k * lux
+
+    def apply(self, lux, wbgt, out=None):
+        # WBGT_lum = WBGT + 照度による上昇分
+        if np is not None:
+            w = _as_float64(wbgt)
+            x = _as_float64(lux)
+            if out is None:
+                out = np.empty(np.broadcast(w, self.k).shape, dtype=np.float64)
+            if np.shares_memory(out, w):                # out=wbgt の時は先に複製する
+                w = w.copy()
+            if np.shares_memory(out, x):                # out=lux の時も同様
+                x = x.copy()
+            np.multiply(x, self.k, out=out)
+            out += w
+            return out
+        return array('d', [w + d for w, d in zip(wbgt, self.delta(lux))])
+
+if __name__ == "__main__":
+    from time import perf_counter
+    for key in sorted(WBGT_COEF):
+        print("Ver.%d Wide=%-5s Ta=28, RH=90 : WBGT = %.5f ℃"
+              % (key[0], key[1], wbgt(28., 90., key[0], key[1])))
+    if np is not None:
+        n = 10000000
+        ta = np.random.uniform(-10., 45., n)
+        rh = np.random.uniform(0., 100., n)
+        out = np.empty(n)
+        t0 = perf_counter()
+        wbgt_batch(ta, rh, out=out)
+        dt = perf_counter() - t0
+        print("%d rows : %.3f s (%.1f M rows/s)" % (n, dt, n / dt / 1e6))
+        lux = np.random.uniform(0., 100000., n)
+        solar = SolarLoad()
+        lum = np.empty(n)
+        t0 = perf_counter()
+        solar.apply(lux, out, out=lum)
+        dt = perf_counter() - t0
+        print("WBGT_lum %d rows : %.3f s (%.1f M rows/s)" % (n, dt, n / dt / 1e6))
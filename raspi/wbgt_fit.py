@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# WBGT 係数の推定 (最小二乗法, 参照データから係数表を作成します)
+#
+# 気温 Ta, 相対湿度 RH, 参照 WBGT の組(数百万行でも可)に
+#   WBGT = a * Ta + b * RH + c * Ta * RH + d
+# (又は高次の項を加えたモデル)を当てはめ、係数を JSON ファイルに出力します。
+# 出力した係数表は wbgt_calc.load_coef() で読み込み、wbgt.py, wbgt_lum.py の
+# coef_file に指定して使用できます(高次の項を含むモデルは wbgt_fit.py の
+# predict() でのみ使用できます)。
+#
+# ・分割QR分解    block 行ずつ QR 分解を繰り返すため、行数に関わらず使用メモリ
+#                 は一定です。正規方程式を使わないため、Ta*RH 等の大きさの
+#                 異なる項があっても精度が落ちません。
+# ・温度帯別の残差 温度帯(5℃毎)毎に 行数, 平均誤差, 二乗平均平方根誤差, 最大誤差
+#                 を表示します。上限・下限の無い温度帯の境界は JSON では null
+#                 です(Infinity を使わない標準の JSON で出力します)。
+#
+# 参照データ：CSVファイル (Ta, RH, WBGT の3列, 先頭行が見出しでも可)
+#             又は NumPy の .npy ファイル (N行3列)
+#
+# 使用方法：
+#   ./wbgt_fit.py 参照データ.csv [出力.json] [名前] [次数(1〜3)]
+#   ./wbgt_fit.py demo              模擬データ(Ver.3 Wide版+雑音)で動作確認
+#
+# 出力例 (名前 site1 の時, wbgt.py では wbgt_ver = 'site1', wbgt_wide = False)：
+#   {"terms": ["Ta", "RH", "Ta*RH", "1"],
+#    "coef": [{"ver": "site1", "wide": false, "values": [...], ...}]}
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import json
+import sys
+from time import perf_counter
+import numpy as np
+from wbgt_calc import WBGT_TERMS                    # 係数表の項 (Ta,RH,Ta*RH,1)
+
+TERMS = {                                           # 次数毎のモデルの項
+    1: WBGT_TERMS,
+    2: WBGT_TERMS + ('Ta^2', 'RH^2'),
+    3: WBGT_TERMS + ('Ta^2', 'RH^2', 'Ta^2*RH', 'Ta*RH^2', 'Ta^3'),
+}
+T_BANDS = (15., 20., 25., 30., 35., 40.)            # 温度帯の境界(℃)
+BLOCK = 65536                                       # 分割QR分解の行数
+
+def design(terms, ta, rh, out=None):
+    # 項の名前(例 'Ta^2*RH')から計画行列を作成する
+    if out is None:
+        out = np.empty((len(ta), len(terms)))
+    cols = {'Ta': ta, 'RH': rh}
+    for j, term in enumerate(terms):
+        col = out[:, j]
+        col[:] = 1.
+        if term == '1':
+            continue
+        for factor in term.split('*'):
+            name, _, power = factor.partition('^')
+            col *= cols[name] ** int(power or 1)
+    return out
+
+def fit(ta, rh, ref, terms=WBGT_TERMS, block=BLOCK):
+    # 係数と残差の二乗和を応答する
+    ta = np.asarray(ta, dtype=np.float64)
+    rh = np.asarray(rh, dtype=np.float64)
+    ref = np.asarray(ref, dtype=np.float64)
+    k = len(terms)
+    r = np.zeros((0, k + 1))
+    buf = np.empty((block, k + 1))
+    for i in range(0, len(ta), block):
+        j = min(i + block, len(ta))
+        a = buf[:j - i]
+        design(terms, ta[i:j], rh[i:j], a[:, :k])
+        a[:, k] = ref[i:j]
+        # [R; 新しい行] を QR 分解して R を更新する ([X | y] の R)
+        r = np.linalg.qr(np.vstack((r, a)), mode='r')
+    if r.shape[0] < k:
+        raise ValueError("行数が項の数より少ないです")
+    coef = np.linalg.solve(r[:k, :k], r[:k, k])
+    sse = float(r[k, k] ** 2) if r.shape[0] > k else 0.
+    return coef, sse
+
+def predict(coef, ta, rh, terms=WBGT_TERMS, block=BLOCK):
+    ta = np.asarray(ta, dtype=np.float64)
+    rh = np.asarray(rh, dtype=np.float64)
+    out = np.empty(len(ta))
+    x = np.empty((min(block, len(ta)), len(terms)))
+    for i in range(0, len(ta), block):
+        j = min(i + block, len(ta))
+        out[i:j] = design(terms, ta[i:j], rh[i:j], x[:j - i]) @ coef
+    return out
+
+def band_residuals(coef, ta, rh, ref, terms=WBGT_TERMS, t_bands=T_BANDS):
+    # 温度帯毎の残差(予測 - 参照)の統計をリストで応答する
+    res = predict(coef, ta, rh, terms) - ref
+    band = np.searchsorted(t_bands, ta, 'right')
+    n = len(t_bands) + 1
+    count = np.bincount(band, minlength=n)
+    total = np.bincount(band, res, minlength=n)
+    sq = np.bincount(band, res * res, minlength=n)
+    worst = np.zeros(n)
+    np.maximum.at(worst, band, np.abs(res))
+    edges = (None,) + tuple(t_bands) + (None,)      # None は上限・下限なし
+    stats = []
+    for i in range(n):
+        if not count[i]:
+            continue
+        stats.append({'t_min': edges[i], 't_max': edges[i + 1],
+                      'rows': int(count[i]),
+                      'mean': float(total[i] / count[i]),
+                      'rmse': float(np.sqrt(sq[i] / count[i])),
+                      'max': float(worst[i])})
+    return stats
+
+def load(filename):
+    # 参照データを (Ta, RH, WBGT) の配列で応答する
+    if filename.endswith('.npy'):
+        data = np.load(filename, mmap_mode='r')
+    else:
+        with open(filename) as f:
+            head = f.readline()
+        skip = 0 if head[:1] in '-+.0123456789' else 1   # 見出し行
+        data = np.loadtxt(filename, delimiter=',', usecols=(0, 1, 2),
+                          skiprows=skip, ndmin=2)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+def table(name, coef, terms, rows, sse, bands):
+    return {'terms': list(terms),
+            'coef': [{'ver': name, 'wide': False,
+                      'values': [float(c) for c in coef], 'rows': rows,
+                      'rmse': (sse / rows) ** 0.5 if rows else 0.,
+                      'bands': bands}]}
+
+def demo_data(n=4000000, seed=0):
+    # Ver.3 Wide版の式に雑音を加えた模擬データ
+    from wbgt_calc import wbgt_batch
+    rng = np.random.default_rng(seed)
+    ta = rng.uniform(10., 42., n)
+    rh = rng.uniform(20., 100., n)
+    ref = wbgt_batch(ta, rh, 3, True) + rng.normal(0., 0.2, n)
+    return ta, rh, ref
+
+def show_bands(bands):
+    def edge(t):
+        return '' if t is None else '%.1f' % t
+    print('  温度帯(℃)        行数      平均誤差  RMSE   最大誤差')
+    for b in bands:
+        print('  %6s - %-6s %10d %9.3f %7.3f %8.3f'
+              % (edge(b['t_min']), edge(b['t_max']), b['rows'], b['mean'],
+                 b['rmse'], b['max']))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage:", sys.argv[0], "参照データ.csv [出力.json] [名前] [次数]")
+        sys.exit(1)
+    out = sys.argv[2] if len(sys.argv) > 2 else None
+    name = sys.argv[3] if len(sys.argv) > 3 else 'site'
+    order = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+    terms = TERMS[order]
+    t0 = perf_counter()
+    if sys.argv[1] == 'demo':
+        ta, rh, ref = demo_data()
+    else:
+        ta, rh, ref = load(sys.argv[1])
+    t1 = perf_counter()
+    coef, sse = fit(ta, rh, ref, terms)
+    t2 = perf_counter()
+    bands = band_residuals(coef, ta, rh, ref, terms)
+    t3 = perf_counter()
+    print('rows = %d, load %.2f s, fit %.2f s, residuals %.2f s'
+          % (len(ta), t1 - t0, t2 - t1, t3 - t2))
+    for term, c in zip(terms, coef):
+        print('  %-8s % .6g' % (term, c))
+    print('  RMSE = %.4f ℃' % (sse / len(ta)) ** 0.5)
+    show_bands(bands)
+    if out:
+        with open(out, 'w') as f:
+            json.dump(table(name, coef, terms, len(ta), sse, bands), f,
+                      indent=1, ensure_ascii=False, allow_nan=False)
+        print('saved', out)
@@ -27,11 +27,24 @@
 sht31  = 0x44                                       # SHT31 0x44 又は 0x45
 bh1750 = 0x23                                       # 照度センサBH1750FVI
 
+sht31_mps = 0                                       # 0:単発, 0.5〜10:定期測定(回/秒)
 wbgt_ver = 3                                        # WBGTバージョン 3または4
 wbgt_wide = True                                    # 筆者の独自拡張Wide版
+coef_file = ''                                      # 係数表(wbgt_fit.pyで作成)
+wbgt_stats = False                                  # 1時間平均と10分間最大を表示
+archive_dir = ''                                    # 保存先フォルダ(空は保存なし)
+metrics_port = 0                                    # 計測値のHTTPポート(0は無効)
 
 import smbus
+import sht31 as sht31_decoder                       # SHT31の測定・変換処理
+from wbgt_calc import wbgt_coef                     # WBGT係数表を組み込む
+from wbgt_calc import load_coef                     # 係数表(JSON)の読み込み
+from wbgt_calc import SolarLoad                     # 照度によるWBGT上昇分
 from time import sleep                              # 時間取得を組み込む
+from time import monotonic                          # 移動窓統計の時刻に使用
+from wbgt_rolling import WBGTAggregator             # WBGTの移動窓統計
+from time import time                               # 保存時の時刻に使用
+from wbgt_archive import ArchiveWriter              # 列指向アーカイブ
 
 def word2uint(d1,d2):
     i = d1
@@ -40,39 +53,60 @@ def word2uint(d1,d2):
     return i
 
 i2c = smbus.SMBus(1)
-math_pi = 3.1415927                                 # 円周率
+if coef_file:
+    load_coef(coef_file)                            # wbgt_ver に名前を指定する
+a, b, c, d = wbgt_coef(wbgt_ver, wbgt_wide)         # WBGT係数を取得
 temp = 0.                                           # 温度値を保持する変数
 hum  = 0.                                           # 湿度値を保持する変数
 lux  = 0.                                           # 照度値を保持する変数
 wbgt = 0.                                           # WGBTを保持する変数
-phantom_s = (0.58 / (2*math_pi))**2 * math_pi       # 照射面積(m2)
+agg = WBGTAggregator() if wbgt_stats else None      # 移動窓統計
+archive = ArchiveWriter(archive_dir) if archive_dir else None   # 保存用
+solar = SolarLoad()                                 # 照射面積等の定数を計算
+conv_sleep = sleep                                  # SHT31の変換待ち
+mt = None                                           # 測定ループの計測値
+if metrics_port:                                    # 計測する時だけ包む
+    import wbgt_metrics
+    reg = wbgt_metrics.Registry()
+    i2c = wbgt_metrics.InstrumentedBus(i2c, reg, sht31_addrs=(sht31,))
+    mt = wbgt_metrics.LoopMetrics(reg, 1.)
+    conv_sleep = wbgt_metrics.timed(sleep, mt.wait)
+    wbgt_metrics.serve(reg, metrics_port)           # http://127.0.0.1:port/metrics
+if sht31_mps:
+    sht31_decoder.start_periodic(i2c, sht31, sht31_mps) # 定期測定を開始
 
 while i2c:
-    i2c.write_byte_data(sht31,0x24,0x00)
-    sleep(0.018)
-    data = i2c.read_i2c_block_data(sht31,0x00,6)
-    data += i2c.read_i2c_block_data(bh1750,0x21,2)
-    if len(data) == 8:
-        temp = float(word2uint(data[0],data[1])) / 65535. * 175. - 45.
-        hum  = float(word2uint(data[3],data[4])) / 65535. * 100.
-        lux  = float(word2uint(data[6],data[7])) / 1.2
-        if wbgt_ver == 3 and wbgt_wide == False:
-            wbgt = 0.687 * temp + 0.0360 * hum + 0.00367 * temp * hum - 2.062
-        elif wbgt_ver == 3 and wbgt_wide == True:
-            wbgt = 0.725 * temp + 0.0368 * hum + 0.00364 * temp * hum - 3.246
-        elif wbgt_ver == 4 and wbgt_wide == False:
-            wbgt = 0.724 * temp + 0.0342 * hum + 0.00277 * temp * hum - 3.007
-        elif wbgt_ver == 4 and wbgt_wide == True:
-            wbgt = 0.754 * temp + 0.0382 * hum + 0.00264 * temp * hum - 3.965
+    if mt:
+        mt.tick()
+    if sht31_mps:
+        res = sht31_decoder.fetch(i2c, sht31)       # 最新の測定値(待ち時間無し)
+    else:
+        res = sht31_decoder.read_single(i2c, sht31, conv_sleep) # 単発測定
+    data = i2c.read_i2c_block_data(bh1750,0x21,2)
+    if len(data) == 2 and res:                      # 新しい値が無い時は None
+        temp, hum = res
+        lux  = float(word2uint(data[0],data[1])) / 1.2
+        wbgt = a * temp + b * hum + c * temp * hum + d
         print("Temp. = %.2f ℃, Humid. = %.0f ％" % (temp,hum),end='')
         print(", Ilum. = %.0f lx" % lux, end='')
         print(", WBGT = %.2f ℃" % wbgt, end='')
         
         # 照度分をWGBTに加算する計算
-        Psun_w = 6e-3 * lux * phantom_s
-        delta = 0.8 * Psun_w * 1.5 * 3600 / 5 / (4184 * (0.37 + 0.63 * 0.55))
-        wbgt_lum = wbgt + delta
-        print(", WBGT_lum = %.2f ℃" % wbgt_lum)
+        wbgt_lum = wbgt + solar.delta(lux)
+        print(", WBGT_lum = %.2f ℃" % wbgt_lum, end='')
+        if agg:
+            agg.update(sht31, monotonic(), wbgt_lum)
+            st = agg.stats(sht31)
+            print(", WBGT_lum_1h = %.2f ℃" % st['mean_1h'], end='')
+            print(", WBGT_lum_max10m = %.2f ℃" % st['max_10m'], end='')
+        print()
+        if archive:
+            archive.append(time(), 'sht31_%02x' % sht31, temp, hum, lux, wbgt,
+                           wbgt_lum)
+        if mt:
+            mt.sample(wbgt, wbgt_lum)
+    elif mt:
+        mt.miss()
     sleep(1)
 
 ''' ----------------------------------------------------------------------------
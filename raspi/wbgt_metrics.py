@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# 測定ループの計測値 (カウンタ, ヒストグラム) と Prometheus 形式の HTTP 出力
+#
+# ・Registry        計測値の登録先。snapshot() で辞書を、render() で
+#                   Prometheus のテキスト形式を応答します。カウンタの名前は
+#                   _total で終わる名前で登録します(TYPE 行と同じ名前で出力)。
+# ・InstrumentedBus smbus.SMBus を包み、I2C通信毎の処理時間、通信エラー(NACK)、
+#                   受信データ不足、SHT31 の CRC 不一致を数えます。
+# ・LoopMetrics     測定ループの周期の遅れ(sleep(1) との差)、変換待ち時間、
+#                   測定数、測定失敗数、最新の WBGT 値を記録します。
+# ・timed()         関数の処理時間をヒストグラムに記録する関数を応答します。
+# ・serve()         http://127.0.0.1:ポート/metrics で計測値を応答します。
+#
+# 計測しない時は、包む前の smbus や sleep をそのまま使用するため、
+# 測定ループの処理は増えません(使用例の if 文で切り替えます)。
+#
+# 使用例：
+#   reg = Registry()
+#   i2c = InstrumentedBus(smbus.SMBus(1), reg, sht31_addrs=(0x44,))
+#   serve(reg, 9109)
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+from bisect import bisect_left
+from time import perf_counter
+import threading
+import sht31 as sht31_decoder                       # SHT31受信データのCRC確認
+
+# ヒストグラムの区間の上限(秒)
+I2C_BUCKETS = (0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05)
+WAIT_BUCKETS = (0.01, 0.015, 0.018, 0.02, 0.025, 0.03, 0.05, 0.1)
+JITTER_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5, 1.)
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def snapshot(self):
+        return self.value
+
+    def render(self):
+        return ['%s %s' % (self.name, self.value)]
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = float('nan')
+
+    def set(self, v):
+        self.value = v
+
+    def snapshot(self):
+        return self.value
+
+    def render(self):
+        return ['%s %r' % (self.name, float(self.value))]
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help='', buckets=I2C_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)  # 最後は上限超え
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, v):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def snapshot(self):
+        return {'buckets': dict(zip(self.bounds + (float('inf'),),
+                                    self.counts)),
+                'sum': self.sum, 'count': self.count}
+
+    def render(self):
+        lines = []
+        n = 0
+        for le, c in zip(self.bounds, self.counts):
+            n += c
+            lines.append('%s_bucket{le="%g"} %d' % (self.name, le, n))
+        lines.append('%s_bucket{le="+Inf"} %d' % (self.name, self.count))
+        lines.append('%s_sum %r' % (self.name, self.sum))
+        lines.append('%s_count %d' % (self.name, self.count))
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError("登録済みの名前です: " + metric.name)
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help=''):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help=''):
+        return self._add(Gauge(name, help))
+
+    def histogram(self, name, help='', buckets=I2C_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def snapshot(self):
+        return {name: m.snapshot() for name, m in self.metrics.items()}
+
+    def render(self):
+        lines = []
+        for m in list(self.metrics.values()):
+            if m.help:
+                lines.append('# HELP %s %s' % (m.name, m.help))
+            lines.append('# TYPE %s %s' % (m.name, m.kind))
+            lines += m.render()
+        return '\n'.join(lines) + '\n'
+
+class InstrumentedBus:
+    def __init__(self, bus, registry, sht31_addrs=()):
+        self.bus = bus
+        self.sht31_addrs = set(sht31_addrs)         # CRCを確認するアドレス
+        self.latency = registry.histogram(
+            'wbgt_i2c_seconds', 'I2C transaction latency', I2C_BUCKETS)
+        self.errors = registry.counter(
+            'wbgt_i2c_errors_total',
+            'I2C errors (NACK, including no new data)')
+        self.short_reads = registry.counter(
+            'wbgt_i2c_short_reads_total', 'I2C reads shorter than requested')
+        self.crc_errors = registry.counter(
+            'wbgt_sht31_crc_errors_total', 'SHT31 CRC mismatches')
+
+    def _call(self, func, *args):
+        t = perf_counter()
+        try:
+            return func(*args)
+        except OSError:
+            self.errors.inc()
+            raise
+        finally:
+            self.latency.observe(perf_counter() - t)
+
+    def write_byte(self, addr, value):
+        return self._call(self.bus.write_byte, addr, value)
+
+    def write_byte_data(self, addr, cmd, value):
+        return self._call(self.bus.write_byte_data, addr, cmd, value)
+
+    def read_i2c_block_data(self, addr, cmd, length=32):
+        data = self._call(self.bus.read_i2c_block_data, addr, cmd, length)
+        if len(data) != length:
+            self.short_reads.inc()
+        elif addr in self.sht31_addrs and length == sht31_decoder.FRAME_SIZE \
+                and sht31_decoder.words(data) is None:
+            self.crc_errors.inc()
+        return data
+
+    def close(self):
+        self.bus.close()
+
+class LoopMetrics:
+    def __init__(self, registry, period=1.):
+        self.period = period                        # 名目上の周期(秒)
+        self.jitter = registry.histogram(
+            'wbgt_loop_jitter_seconds', 'Loop interval minus nominal period',
+            JITTER_BUCKETS)
+        self.wait = registry.histogram(
+            'wbgt_conversion_wait_seconds', 'SHT31 conversion wait',
+            WAIT_BUCKETS)
+        self.samples = registry.counter('wbgt_samples_total',
+                                        'Valid samples')
+        self.misses = registry.counter('wbgt_sample_misses_total',
+                                       'Loops without a valid sample')
+        self.wbgt = registry.gauge('wbgt_celsius', 'Last WBGT')
+        self.wbgt_lum = registry.gauge('wbgt_lum_celsius', 'Last WBGT_lum')
+        self._t = None                              # 前回のループ開始時刻
+
+    def tick(self):                                 # ループの先頭で呼び出す
+        t = perf_counter()
+        if self._t is not None:
+            self.jitter.observe(max(t - self._t - self.period, 0.))
+        self._t = t
+
+    def sample(self, wbgt, wbgt_lum=float('nan')):
+        self.samples.inc()
+        self.wbgt.set(wbgt)
+        self.wbgt_lum.set(wbgt_lum)
+
+    def miss(self):
+        self.misses.inc()
+
+def timed(func, hist):
+    # func の処理時間を hist に記録する関数を応答する
+    def wrapper(*args):
+        t = perf_counter()
+        try:
+            return func(*args)
+        finally:
+            hist.observe(perf_counter() - t)
+    return wrapper
+
+def serve(registry, port, host='127.0.0.1'):
+    # 別スレッドで HTTP サーバを起動する (GET /metrics)
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):               # アクセス毎の表示なし
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    import i2c_sim
+    from urllib.request import urlopen
+    reg = Registry()
+    bus = i2c_sim.FakeSMBus(1)
+    bus.add(i2c_sim.SimSHT31(0x44, 29.2, 70.))
+    i2c = InstrumentedBus(bus, reg, sht31_addrs=(0x44,))
+    for i in range(10):
+        print(sht31_decoder.read_single(i2c, 0x44))
+    server = serve(reg, 0)
+    print(urlopen('http://127.0.0.1:%d/metrics' % server.server_port)
+          .read().decode())
+    server.shutdown()
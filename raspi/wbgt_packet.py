@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# WBGT バイナリ・パケット形式 (example04_wbgt_udp_le.py の udp_format = 'bin')
+#
+# ヘッダ(22バイト, リトルエンディアン)
+#   0xA5 'W'(2) 形式番号(1) レコード数(1) デバイス識別名(16, 0x00で埋める)
+#   順序番号(2)
+#   先頭の 0xA5 は ASCII 以外のため、CSVxUDP の行(デバイス名は ASCII)とは
+#   重なりません(WBGT_1 等の名前のデバイスの CSV もバイナリと誤りません)。
+# レコード(6バイト/件)
+#   SHT31 温度ワード(2) SHT31 湿度ワード(2) BH1750 照度ワード(2, 無い時 0xFFFF)
+#
+# 形式番号2(batch_n > 1 の蓄積送信)は、ヘッダの後に測定間隔(2,秒)が続きます。
+# 順序番号は先頭レコードの番号で、各レコードは測定間隔おきの古い順に並びます。
+# デバイス識別名は16バイト以下の ASCII 文字列です(長い名前は送信できません)。
+#
+# ・encode()       パケットを生成します(試験用・シミュレータ用)
+#                  デバイス識別名が16バイトを超える時は ValueError になります。
+# ・decode_packet() 1パケットを (device, seq, [(温度ワード,湿度ワード,照度ワード)],
+#                   測定間隔) に変換します。形式番号1の測定間隔は 0 です。
+#                   不正なパケット(識別名が ASCII 以外を含む時等)の時は None
+#                   を応答します。
+# ・decode_batch()  1レコードの固定長パケットのリストを NumPy構造化dtype
+#                   (無い時は struct.iter_unpack) で一括変換します。識別名が
+#                   不正なパケットは対象外として decode_packet() に回します。
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+import struct
+
+try:
+    import numpy as np                              # NumPy(あれば使用する)
+except ImportError:
+    np = None
+
+MAGIC = b'\xa5W'                                    # パケット識別子(先頭は非ASCII)
+FORMAT_VER = 1                                      # パケット形式番号
+BATCH_VER = 2                                       # 蓄積送信の形式番号
+HEADER_FORMAT = '<2sBB16sH'                         # 識別子,形式,件数,名前,順序
+DEVICE_SIZE = 16                                    # デバイス識別名の最大長
+BATCH_FORMAT = '<H'                                 # 形式番号2の測定間隔(秒)
+RECORD_FORMAT = '<HHH'                              # 温度,湿度,照度ワード
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)        # 22バイト
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)        # 6バイト
+BATCH_SIZE = struct.calcsize(BATCH_FORMAT)          # 2バイト
+PACKET_SIZE = HEADER_SIZE + RECORD_SIZE             # 1レコードのパケット長 28
+LUX_NONE = 0xFFFF                                   # 照度センサ無し
+if np is not None:
+    PACKET_DTYPE = np.dtype([('magic', 'S2'), ('ver', 'u1'), ('count', 'u1'),
+                             ('device', 'S16'), ('seq', '<u2'),
+                             ('temp', '<u2'), ('hum', '<u2'), ('lux', '<u2')])
+
+def raw2lux(raw):
+    return float(raw) / 1.2
+
+def encode(device, seq, records, interval=None):
+    # records: [(温度ワード, 湿度ワード, 照度ワード), ...]
+    # interval を指定すると形式番号2(蓄積送信)のパケットを生成する
+    ver = FORMAT_VER if interval is None else BATCH_VER
+    name = device.encode()
+    if not name or len(name) > DEVICE_SIZE or not name.isascii():
+        raise ValueError("デバイス識別名が不正です: %r" % device)
+    data = struct.pack(HEADER_FORMAT, MAGIC, ver, len(records), name,
+                       seq & 0xFFFF)
+    if interval is not None:
+        data += struct.pack(BATCH_FORMAT, interval)
+    for rec in records:
+        data += struct.pack(RECORD_FORMAT, *rec)
+    return data
+
+def is_binary(data):
+    # バイナリ形式のヘッダを持つ時 True (False の時は CSV として解析する)
+    return (data[:2] == MAGIC and len(data) >= HEADER_SIZE
+            and data[2] in (FORMAT_VER, BATCH_VER))
+
+def decode_packet(data):
+    if len(data) < HEADER_SIZE or data[:2] != MAGIC:
+        return None
+    magic, ver, count, device, seq = struct.unpack_from(HEADER_FORMAT, data)
+    device = device.rstrip(b'\x00')
+    if not device or not device.isascii():
+        return None
+    offset = HEADER_SIZE
+    interval = 0
+    if ver == BATCH_VER:
+        if len(data) < HEADER_SIZE + BATCH_SIZE:
+            return None
+        interval = struct.unpack_from(BATCH_FORMAT, data, offset)[0]
+        offset += BATCH_SIZE
+    elif ver != FORMAT_VER:
+        return None
+    if len(data) != offset + count * RECORD_SIZE:
+        return None
+    records = list(struct.iter_unpack(RECORD_FORMAT, memoryview(data)[offset:]))
+    return device.decode(), seq, records, interval
+
+def valid_device(data):
+    # パケットのデバイス識別名が ASCII 文字列の時に True
+    device = data[4:4 + DEVICE_SIZE]
+    return device[:1] != b'\x00' and device.isascii()
+
+def decode_batch(packets):
+    # 1レコードの固定長パケットのみを対象とし、(配列の辞書, 対象外パケット) を応答
+    fixed = []
+    others = []
+    for p in packets:
+        if len(p) == PACKET_SIZE and p[:2] == MAGIC and p[3] == 1 \
+                and valid_device(p):
+            fixed.append(p)
+        else:
+            others.append(p)
+    buf = b''.join(fixed)
+    if np is not None:
+        pk = np.frombuffer(buf, dtype=PACKET_DTYPE)
+        ok = pk['ver'] == FORMAT_VER
+        if not ok.all():
+            others += [fixed[i] for i in np.flatnonzero(~ok)]
+            pk = pk[ok]
+        temp = pk['temp'].astype(np.float64)
+        temp /= 65535.
+        temp *= 175.
+        temp -= 45.
+        hum = pk['hum'].astype(np.float64)
+        hum /= 65535.
+        hum *= 100.
+        lux = pk['lux'].astype(np.float64)
+        lux /= 1.2
+        lux[pk['lux'] == LUX_NONE] = np.nan
+        device = np.char.rstrip(pk['device'], b'\x00')
+        return {'device': device, 'seq': pk['seq'], 'temp': temp,
+                'hum': hum, 'lux': lux}, others
+    from array import array
+    res = {'device': [], 'seq': array('H'), 'temp': array('d'),
+           'hum': array('d'), 'lux': array('d')}
+    fmt = HEADER_FORMAT + RECORD_FORMAT[1:]
+    for i, cols in enumerate(struct.iter_unpack(fmt, buf)):
+        magic, ver, count, device, seq, t, h, lx = cols
+        if ver != FORMAT_VER:
+            others.append(fixed[i])
+            continue
+        res['device'].append(device.rstrip(b'\x00'))
+        res['seq'].append(seq)
+        res['temp'].append(float(t) / 65535. * 175. - 45.)
+        res['hum'].append(float(h) / 65535. * 100.)
+        res['lux'].append(float('nan') if lx == LUX_NONE else raw2lux(lx))
+    return res, others
+
+if __name__ == "__main__":
+    pkt = encode('humid_3', 1, [(0x6666, 0x8F5C, LUX_NONE)])
+    print(len(pkt), pkt.hex())
+    print(decode_packet(pkt))
+    print(decode_batch([pkt, pkt]))
+    pkt = encode('humid_3', 10, [(0x6666, 0x8F5C, LUX_NONE)] * 3, 30)
+    print(len(pkt), decode_packet(pkt))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+################################################################################
+# WBGT の移動窓統計 (1時間平均, 10分間最大, 警戒レベル以上の時間など)
+#
+# デバイス毎に1個のリングバッファ(array('d') の時刻, 値, 経過時間)を持ち、
+# 全ての窓で共有します。各窓はリングバッファ上の自分の先頭位置と、合計値、
+# 単調デック(最大値・最小値の位置)を持ち、新しい値が届く度に更新します。
+# 1件あたりの処理量は窓の長さやデバイス数に関わらず一定(償却 O(1))です。
+# リングバッファは必要に応じて capacity 件まで倍々に拡張するため、
+# 1秒毎の値でも1デバイスあたり約 100KB(capacity=4096 の時)が上限です。
+#
+# 警戒レベル以上の時間：各値は前回の値からの経過時間(最大 max_gap 秒)を
+# 持つものとし、その値が各閾値以上であれば経過時間を加算します。
+#
+# 使用例：
+#   agg = WBGTAggregator()
+#   agg.update('humid_3', time(), 27.9)
+#   agg.stats('humid_3')    # {'mean_1h': .., 'max_10m': .., 'above_28_1h': ..}
+#
+#                                               Copyright (c) 2024 Wataru KUNINO
+################################################################################
+
+from array import array
+from collections import deque
+
+WINDOWS = {'10m': 600., '1h': 3600.}                # 窓の名前と時間幅(秒)
+BANDS = (25., 28., 31.)                             # 警戒, 厳重警戒, 危険
+
+class SampleRing:
+    # 時刻, 値, 経過時間のリングバッファ。番号 i の値は i % size の位置に置く
+    def __init__(self, capacity=4096, size=64):
+        self.capacity = capacity                    # 保持する最大件数
+        self.size = min(size, capacity)             # 確保済みの件数
+        self.t = array('d', bytes(8 * self.size))   # 時刻
+        self.v = array('d', bytes(8 * self.size))   # 値
+        self.dt = array('d', bytes(8 * self.size))  # 経過時間
+        self.head = 0                               # 最古の値の番号
+        self.tail = 0                               # 次に追加する値の番号
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def full(self):
+        return self.tail - self.head >= self.capacity
+
+    def append(self, t, v, dt):
+        # 値を追加して番号を応答する (満杯の時は先に head を進めること)
+        if self.tail - self.head >= self.size:
+            self._grow()
+        j = self.tail % self.size
+        self.t[j] = t
+        self.v[j] = v
+        self.dt[j] = dt
+        self.tail += 1
+        return self.tail - 1
+
+    def _grow(self):
+        size = min(self.size * 2, self.capacity)
+        for name in ('t', 'v', 'dt'):
+            old = getattr(self, name)
+            new = array('d', bytes(8 * size))
+            for i in range(self.head, self.tail):   # 番号を変えずに並べ直す
+                new[i % size] = old[i % self.size]
+            setattr(self, name, new)
+        self.size = size
+
+class RollingWindow:
+    # 共有のリングバッファ上で、番号 start 以降の値を集計する窓
+    def __init__(self, span, bands=BANDS):
+        self.span = span                            # 窓の時間幅(秒)
+        self.bands = bands
+        self.start = 0                              # 窓内の最古の値の番号
+        self.total = 0.                             # 値の合計
+        self.above = [0.] * len(bands)              # 閾値以上の時間(秒)
+        self._max = deque()                         # 単調減少デック (番号)
+        self._min = deque()                         # 単調増加デック (番号)
+
+    def _pop(self, ring):
+        k = self.start
+        j = k % ring.size
+        v = ring.v[j]
+        self.total -= v
+        for i, b in enumerate(self.bands):
+            if v >= b:
+                self.above[i] -= ring.dt[j]
+        if self._max[0] == k:
+            self._max.popleft()
+        if self._min[0] == k:
+            self._min.popleft()
+        self.start = k + 1
+
+    def add(self, ring, k):
+        # リングバッファに追加した番号 k の値を窓に加える
+        size = ring.size
+        vs = ring.v
+        v = vs[k % size]
+        self.total += v
+        for i, b in enumerate(self.bands):
+            if v >= b:
+                self.above[i] += ring.dt[k % size]
+        mx = self._max
+        while mx and vs[mx[-1] % size] <= v:
+            mx.pop()
+        mx.append(k)
+        mn = self._min
+        while mn and vs[mn[-1] % size] >= v:
+            mn.pop()
+        mn.append(k)
+        self.expire(ring, ring.t[k % size])
+
+    def expire(self, ring, now):
+        limit = now - self.span
+        ts = ring.t
+        while self.start < ring.tail and ts[self.start % ring.size] <= limit:
+            self._pop(ring)
+        if self.start == ring.tail:                 # 誤差の蓄積を消去
+            self.total = 0.
+            self.above = [0.] * len(self.bands)
+
+    def mean(self, ring):
+        n = ring.tail - self.start
+        return self.total / n if n else None
+
+    def max(self, ring):
+        return ring.v[self._max[0] % ring.size] if self._max else None
+
+    def min(self, ring):
+        return ring.v[self._min[0] % ring.size] if self._min else None
+
+class WBGTAggregator:
+    def __init__(self, windows=WINDOWS, bands=BANDS, capacity=4096,
+                 max_gap=300.):
+        self.windows = dict(windows)
+        self.bands = tuple(bands)
+        self.capacity = capacity                    # デバイス毎の上限件数
+        self.max_gap = max_gap                      # 経過時間の上限(秒)
+        self.devices = {}                           # デバイス毎の窓と前回時刻
+
+    def update(self, device, t, wbgt):
+        dev = self.devices.get(device)
+        if dev is None:
+            wins = [RollingWindow(span, self.bands)
+                    for span in self.windows.values()]
+            dev = self.devices[device] = [SampleRing(self.capacity), wins, None]
+        ring, wins, t_prev = dev
+        if t_prev is not None and t < t_prev:       # 時刻が戻った値は無視
+            return
+        dt = 0. if t_prev is None else min(t - t_prev, self.max_gap)
+        dev[2] = t
+        if ring.full():                             # 上限を超えた古い値を破棄
+            for w in wins:
+                if w.start == ring.head:
+                    w._pop(ring)
+            ring.head += 1
+        k = ring.append(t, wbgt, dt)
+        for w in wins:
+            w.add(ring, k)
+        ring.head = min(w.start for w in wins)      # 全ての窓から外れた値を解放
+
+    def stats(self, device, now=None):
+        dev = self.devices.get(device)
+        if dev is None:
+            return None
+        ring, wins, t_prev = dev
+        res = {}
+        for name, w in zip(self.windows, wins):
+            if now is not None:
+                w.expire(ring, now)
+            res['mean_' + name] = w.mean(ring)
+            res['max_' + name] = w.max(ring)
+            res['min_' + name] = w.min(ring)
+            for b, sec in zip(self.bands, w.above):
+                res['above_%g_%s' % (b, name)] = sec
+        if now is not None:
+            ring.head = min(w.start for w in wins)
+        return res
+
+    def remove(self, device):
+        self.devices.pop(device, None)
+
+if __name__ == "__main__":
+    from time import perf_counter
+    import random
+    agg = WBGTAggregator()
+    for i in range(7200):                           # 1秒毎に2時間分
+        agg.update('humid_3', float(i), 26. + 3. * random.random())
+    for k, v in agg.stats('humid_3').items():
+        print(k, '=', round(v, 2))
+    n_dev = 2000
+    agg = WBGTAggregator()
+    t0 = perf_counter()
+    for i in range(200000):
+        agg.update(i % n_dev, i // n_dev * 30., 20. + (i % 17))
+    dt = perf_counter() - t0
+    print("%d devices: %.1f k updates/s" % (n_dev, 200000 / dt / 1000))